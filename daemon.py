@@ -0,0 +1,210 @@
+"""
+ODMPY-NG daemon: keeps logged-in browsers warm between downloads and takes
+download jobs from a spool directory.
+
+A job is a JSON file dropped into the spool directory, for example:
+
+    {"id": 1234567, "site-id": 103, "name-dir": "Some Book", "retry": false}
+
+Only "id" is required. The library is picked with "library" (index) or
+"site-id" like the interactive options, and defaults to the first library.
+Jobs are moved to processing/ while they run, then to done/ or failed/.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import signal
+import time
+from scraper import Scraper
+import interactive
+import download_client
+import thunder_cache
+
+class ScraperSessions:
+    """Holds one logged-in Scraper per library, re-validating sessions only once they may have expired."""
+    def __init__(self, config: dict, cookie_file: str, session_ttl: int):
+        """
+        Args:
+            config (dict): Full user configuration.
+            cookie_file (str): Path of the shared cookie file.
+            session_ttl (int): Seconds a validated session is trusted without checking it again.
+        """
+        self.config = config
+        self.cookie_file = cookie_file
+        self.session_ttl = session_ttl
+        self.sessions = {} # library index -> [scraper, scraper_config, validated_at or None if never]
+
+    def get(self, library_index: int, allow_retry: bool) -> tuple[Scraper, dict]:
+        """
+        Returns a logged-in scraper for a library, starting Chrome only the first time.
+
+        Args:
+            library_index (int): Index of the library within the config.
+            allow_retry (bool): Whether the job may resume a stopped download.
+
+        Returns:
+            tuple: (scraper, scraper_config)
+        """
+        session = self.sessions.get(library_index)
+        if session is None:
+            library = self.config["libraries"][library_index]
+            print(f"Starting browser for library: {library['name']}")
+            scraper_config = interactive.make_scraper_config(self.config, library, allow_retry)
+            session = [Scraper(scraper_config), scraper_config, None]
+            self.sessions[library_index] = session
+            cookies = interactive.load_cookies(self.cookie_file)
+        else:
+            cookies = session[0].get_cookies()
+
+        scraper, scraper_config, validated_at = session
+        scraper_config["allow-retry"] = allow_retry
+        if validated_at is None or time.monotonic() - validated_at > self.session_ttl:
+            cookies = scraper.ensure_login(cookies)
+            if not cookies:
+                raise Exception("Sign in failed")
+            with open(self.cookie_file, "w") as f:
+                json.dump(cookies, f, indent=4)
+            session[2] = time.monotonic()
+        return scraper, scraper_config
+
+    def expire(self, library_index: int):
+        """Forces the library's session to be checked again before its next use."""
+        if library_index in self.sessions:
+            self.sessions[library_index][2] = None
+
+    def close(self):
+        """Shuts down every browser."""
+        for scraper, _, _ in self.sessions.values():
+            if scraper.driver:
+                scraper.driver.quit()
+                scraper.driver = None
+        self.sessions.clear()
+
+def find_library_index(libraries: list, job: dict) -> int:
+    """
+    Picks the library a job asks for.
+
+    Args:
+        libraries (list): The config's libraries.
+        job (dict): The job description.
+
+    Returns:
+        int: Index of the library within the config.
+    """
+    if job.get("site-id") is not None:
+        for i, library in enumerate(libraries):
+            if library.get("site-id") == job["site-id"]:
+                return i
+        raise ValueError(f"Library matching site-id {job['site-id']} not found in config")
+    library_index = job.get("library", 0)
+    if not 0 <= library_index < len(libraries):
+        raise ValueError(f"Library {library_index} not found in config")
+    return library_index
+
+def run_job(sessions: ScraperSessions, config: dict, job: dict, downloads_dir: pathlib.Path, tmp_base: pathlib.Path) -> bool:
+    """
+    Downloads the book a job asks for.
+
+    Args:
+        sessions (ScraperSessions): The warm browser sessions.
+        config (dict): Full user configuration.
+        job (dict): The job description.
+        downloads_dir (Path): Base directory for finished books.
+        tmp_base (Path): Base directory for per-book tmp dirs.
+
+    Returns:
+        bool: True if the book was downloaded.
+    """
+    library_index = find_library_index(config["libraries"], job)
+    scraper, scraper_config = sessions.get(library_index, job.get("retry", False))
+
+    books = scraper.get_loans()
+    book_selection = next((b for b in books if b["id"] == str(job["id"])), None)
+    if not book_selection:
+        print(f"ERROR: Book {job['id']} is not on loan")
+        return False
+
+    return interactive.download_book(scraper, book_selection, config, scraper_config, downloads_dir, tmp_base, job.get("name-dir"))
+
+def stop(signum, frame):
+    """Turns SIGTERM into KeyboardInterrupt, which job error handling doesn't swallow."""
+    raise KeyboardInterrupt
+
+def main():
+    print("Starting ODMPY-NG daemon")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config_file", type=str, help="Path to config file")
+    parser.add_argument("--spool", type=str, help="Directory to take job files from (default: spool next to the config file)")
+    parser.add_argument("--poll", type=float, default=5, help="Seconds between checks of the spool directory")
+    args = parser.parse_args()
+
+    config = interactive.load_config(args.config_file)
+    download_client.configure(config)
+    config_dir = os.path.dirname(args.config_file)
+    thunder_cache.configure(config, os.path.join(config_dir, "thunder-cache"))
+    cookie_file = os.path.join(config_dir, "cookies")
+
+    downloads_dir = pathlib.Path("/downloads")
+    tmp_base = pathlib.Path("/tmp-downloads")
+    tmp_base.mkdir(parents=True, exist_ok=True)
+    os.makedirs(downloads_dir, mode=0o755, exist_ok=True)
+
+    spool = pathlib.Path(args.spool or os.path.join(config_dir, "spool"))
+    for sub in ("processing", "done", "failed"):
+        (spool / sub).mkdir(parents=True, exist_ok=True)
+    print(f"Waiting for jobs in {spool}")
+
+    sessions = ScraperSessions(config, cookie_file, config.get("daemon_session_ttl", 30*60))
+    # docker stop sends SIGTERM, exit cleanly so the browsers get closed.
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while True:
+            for job_file in sorted(spool.glob("*.json")):
+                # Claim the job by moving it, so it's never run twice.
+                claimed = spool / "processing" / job_file.name
+                try:
+                    job_file.rename(claimed)
+                except OSError:
+                    continue
+
+                print(f"Starting job {job_file.name}")
+                success = False
+                finished = False
+                try:
+                    try:
+                        with open(claimed) as f:
+                            job = json.load(f)
+                        # A failure may just be an expired session, so retry once
+                        # after checking the login again.
+                        for attempt in range(2):
+                            try:
+                                success = run_job(sessions, config, job, downloads_dir, tmp_base)
+                            except (Exception, SystemExit) as e:
+                                # The scraper exits on errors, which mustn't take the daemon down.
+                                print(f"Job {job_file.name} failed: {e!r}")
+                                sessions.expire(find_library_index(config["libraries"], job))
+                                job["retry"] = True
+                                continue
+                            break
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Invalid job {job_file.name}: {e}")
+                    finished = True
+                finally:
+                    if finished:
+                        claimed.rename(spool / ("done" if success else "failed") / job_file.name)
+                        print(f"Finished job {job_file.name}: {'done' if success else 'failed'}")
+                    else:
+                        # Stopped mid-job, it runs again on the next start.
+                        claimed.rename(job_file)
+                        print(f"Returned job {job_file.name} to the spool")
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print("Stopping ODMPY-NG daemon")
+    finally:
+        sessions.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Standard headers for web requests to mimic a browser
+headers = {'User-Agent': 'Mozilla/5.0'}
+
+# Responses worth asking for again, the CDN returns these under load.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Failures worth retrying: refused or reset connections, timeouts and bodies cut short.
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class DownloadClient:
+    """
+    Shared HTTP client for all OverDrive downloads: one keep-alive connection
+    pool, timeouts on every request, exponential backoff on transient errors,
+    and a record of the bytes and time each request took.
+    """
+    def __init__(self, connect_timeout: float = 10, read_timeout: float = 60, retries: int = 4,
+                 backoff: float = 1.0, chunk_size: int = 1024*1024, pool_size: int = 16):
+        """
+        Args:
+            connect_timeout (float): Seconds to wait for a connection.
+            read_timeout (float): Seconds to wait for each read from the server.
+            retries (int): Times a failed request is tried again.
+            backoff (float): Delay before the first retry, doubled on each further one.
+            chunk_size (int): Bytes read from a streamed body at a time.
+            pool_size (int): Connections kept open per host.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.lock = threading.Lock()
+        self.stats = [] # (url, bytes, seconds) per finished request
+
+    def wait_before_retry(self, attempt: int, response: requests.Response | None = None):
+        """
+        Sleeps before retry number attempt+1, honouring a server's Retry-After.
+
+        Args:
+            attempt (int): Number of attempts already made, starting at 0.
+            response (Response): The failed response, if there was one.
+        """
+        delay = self.backoff * 2**attempt
+        retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        time.sleep(delay)
+
+    def get(self, url: str, cookies: list | None = None, extra_headers: dict | None = None,
+            stream: bool = False, retry: bool = True) -> requests.Response:
+        """
+        Sends a GET request, retrying connection errors and transient statuses.
+
+        Args:
+            url (str): The URL to fetch.
+            cookies (list): List of cookies (dicts) for authentication.
+            extra_headers (dict): Headers to send on top of the standard ones.
+            stream (bool): Leave the body to be read with iter_body().
+            retry (bool): Retry on failure, otherwise fail on the first error.
+
+        Returns:
+            Response: The last response received, which may still be an error status.
+
+        Raises:
+            requests.RequestException: If no response could be had.
+        """
+        # Without retry, the only attempt is also the last one.
+        first = 0 if retry else self.retries
+        for attempt in range(first, self.retries + 1):
+            if (response := self.get_attempt(url, attempt, cookies, extra_headers, stream)) is not None:
+                return response
+
+    def get_attempt(self, url: str, attempt: int, cookies: list | None = None, extra_headers: dict | None = None,
+                    stream: bool = False) -> requests.Response | None:
+        """
+        Sends one try of a request, for callers that also retry failures
+        while reading the body and so run the retry loop themselves, sharing
+        one budget of attempts between the two.
+
+        Args:
+            url (str): The URL to fetch.
+            attempt (int): Number of attempts already made, starting at 0.
+            cookies (list): List of cookies (dicts) for authentication.
+            extra_headers (dict): Headers to send on top of the standard ones.
+            stream (bool): Leave the body to be read with iter_body().
+
+        Returns:
+            Response or None: The response, or None after waiting if it is worth
+                trying again. The last attempt always returns its response.
+
+        Raises:
+            requests.RequestException: If the last attempt got no response.
+        """
+        cookie_dict = {cookie['name']: cookie['value'] for cookie in cookies or []}
+        last = attempt >= self.retries
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, headers=extra_headers, cookies=cookie_dict, stream=stream, timeout=self.timeout)
+        except RETRY_ERRORS as e:
+            if last:
+                raise
+            print(f"Request failed ({e.__class__.__name__}), retrying: {url}")
+            self.wait_before_retry(attempt)
+            return None
+
+        if response.status_code in RETRY_STATUSES and not last:
+            print(f"Server returned {response.status_code}, retrying: {url}")
+            response.close()
+            self.wait_before_retry(attempt, response)
+            return None
+
+        if not stream:
+            self.record(url, len(response.content), time.monotonic() - start)
+        return response
+
+    def iter_body(self, response: requests.Response):
+        """
+        Yields a streamed response's body in large chunks, recording its size and time once read.
+
+        Args:
+            response (Response): A response from get(..., stream=True).
+        """
+        start = time.monotonic()
+        received = 0
+        for chunk in response.iter_content(self.chunk_size):
+            received += len(chunk)
+            yield chunk
+        self.record(response.url, received, response.elapsed.total_seconds() + time.monotonic() - start)
+
+    def record(self, url: str, received: int, seconds: float):
+        """Adds a finished request to the stats."""
+        with self.lock:
+            self.stats.append((url, received, seconds))
+
+    def summary(self) -> str:
+        """Returns the request count, total bytes and average throughput so far."""
+        with self.lock:
+            count = len(self.stats)
+            received = sum(s[1] for s in self.stats)
+            seconds = sum(s[2] for s in self.stats)
+        rate = received / seconds / 1024 / 1024 if seconds else 0
+        return f"{count} request(s), {received / 1024 / 1024:.1f} MiB in {seconds:.1f}s ({rate:.2f} MiB/s)"
+
+# The client shared by every download in the process.
+client = DownloadClient()
+
+def configure(config: dict):
+    """
+    Replaces the shared client with one using the timeouts and retries from the user configuration.
+
+    Args:
+        config (dict): Full user configuration.
+    """
+    global client
+    client = DownloadClient(
+        connect_timeout=config.get("http_connect_timeout", 10),
+        read_timeout=config.get("http_read_timeout", 60),
+        retries=config.get("http_retries", 4),
+        backoff=config.get("http_backoff", 1.0),
+    )
@@ -0,0 +1,81 @@
+import os
+import re
+import shutil
+import subprocess
+from webdriver_manager.chrome import ChromeDriverManager
+
+# Browser binaries to ask for the installed Chrome version, in order.
+CHROME_BINARIES = ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"]
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "odmpy-ng", "chromedriver")
+
+def binary_version(binary: str) -> str | None:
+    """
+    Runs a binary with --version and extracts the dotted version number.
+
+    Args:
+        binary (str): Name or path of the executable.
+
+    Returns:
+        str or None: Version such as '120.0.6099.109', or None if it can't be run.
+    """
+    try:
+        result = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r'(\d+(?:\.\d+)+)', result.stdout)
+    return match.group(1) if match else None
+
+def chrome_version() -> str | None:
+    """Returns the installed Chrome version, or None if no browser is found."""
+    for binary in CHROME_BINARIES:
+        if shutil.which(binary) and (version := binary_version(binary)):
+            return version
+    return None
+
+def same_major(version_a: str | None, version_b: str | None) -> bool:
+    """Checks two versions share a major number, a driver only works with its own major."""
+    if not version_a or not version_b:
+        return False
+    return version_a.split('.')[0] == version_b.split('.')[0]
+
+def resolve_chromedriver(config_path: str | None = None, cache_dir: str | None = None) -> str:
+    """
+    Finds a chromedriver without touching the network when possible.
+
+    Tries, in order: an explicit path from the config, a local cache keyed by
+    the Chrome version, the system chromedriver, and only then webdriver-manager
+    (whose download is copied into the cache for next time).
+
+    Args:
+        config_path (str): Explicit chromedriver path, if configured.
+        cache_dir (str): Directory holding cached drivers, one subdirectory per Chrome version.
+
+    Returns:
+        str: Path of the chromedriver executable.
+    """
+    if config_path:
+        if os.path.isfile(config_path):
+            return config_path
+        print(f"Warning: configured chromedriver not found: {config_path}")
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    version = chrome_version()
+    cached = os.path.join(cache_dir, version, "chromedriver") if version else None
+    if cached and os.path.isfile(cached):
+        return cached
+
+    # The selenium/standalone-chrome image ships a matching driver.
+    system = shutil.which("chromedriver")
+    if system and (not version or same_major(version, binary_version(system))):
+        return system
+
+    print("No local chromedriver matches, fetching one with webdriver-manager")
+    path = ChromeDriverManager().install()
+    if cached:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            shutil.copy2(path, cached)
+        except OSError as e:
+            print(f"Warning: could not cache chromedriver: {e}")
+    return path
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import threading
+from atomicwrites import atomic_write
+from mutagen.mp4 import MP4
+from mutagen import MutagenError
+from part_manifest import MANIFEST_FILE, file_checksum
+import convert_metadata
+
+# Ledger of encoded parts, kept in the book's tmp dir next to the part manifest.
+ENCODE_CACHE_FILE = "encoded.json"
+
+class EncodeCache:
+    """
+    Remembers which source and encode settings each encoded part was made
+    from, so a retry only encodes parts that are missing, broken, or were
+    encoded from different audio or with different settings.
+    """
+    def __init__(self, directory: str, tolerance: float = 1.0):
+        """
+        Loads the cache from the given directory, starting empty if there is none.
+
+        Args:
+            directory (str): The book's tmp dir holding the parts.
+            tolerance (float): Seconds an encoded part's duration may differ from its source's.
+        """
+        self.directory = directory
+        self.tolerance = tolerance
+        self.path = os.path.join(directory, ENCODE_CACHE_FILE)
+        self.lock = threading.Lock()
+        self.parts = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    self.parts = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                # Every part will just be encoded again.
+                print(f"Ignoring unreadable encode cache: {e}")
+
+    def source_info(self, mp3_file: str) -> tuple[str, float]:
+        """
+        Returns a source part's checksum and duration, from the part manifest when it is current.
+
+        Args:
+            mp3_file (str): Path of the source MP3 part.
+
+        Returns:
+            tuple: The part's sha256 hex digest and its duration in seconds.
+        """
+        stat = os.stat(mp3_file)
+        try:
+            # Only read, the scraper may still be writing the manifest.
+            with open(os.path.join(self.directory, MANIFEST_FILE)) as f:
+                entry = json.load(f).get(os.path.basename(mp3_file))
+        except (OSError, json.JSONDecodeError):
+            entry = None
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["checksum"], entry["duration"]
+        return file_checksum(mp3_file), convert_metadata.get_mp3_duration(mp3_file)
+
+    def key(self, checksum: str, params: dict) -> str:
+        """
+        Returns the cache key for encoding a part with the given settings.
+
+        Args:
+            checksum (str): The source part's checksum, from source_info().
+            params (dict): Every encode setting that changes the output (bitrate, sample rate, profile...).
+
+        Returns:
+            str: Hex digest of the source checksum and the settings.
+        """
+        return hashlib.sha256(f"{checksum}:{json.dumps(params, sort_keys=True)}".encode()).hexdigest()
+
+    def is_valid(self, out_file: str, key: str, source_duration: float) -> bool:
+        """
+        Checks an encoded part was made with this key and still holds all of its source's audio.
+
+        Args:
+            out_file (str): Path of the encoded part.
+            key (str): Key from key().
+            source_duration (float): The source part's duration, from source_info().
+
+        Returns:
+            bool: True if the encoded part can be used as it is.
+        """
+        with self.lock:
+            entry = self.parts.get(os.path.basename(out_file))
+        if not entry or entry["key"] != key or not os.path.isfile(out_file):
+            return False
+        try:
+            encoded_duration = MP4(out_file).info.length
+        except MutagenError:
+            return False
+        return abs(encoded_duration - source_duration) <= self.tolerance
+
+    def record(self, out_file: str, key: str):
+        """
+        Adds or replaces an encoded part's entry, called right after it is written.
+
+        Args:
+            out_file (str): Path of the encoded part.
+            key (str): Key from key().
+        """
+        with self.lock:
+            self.parts[os.path.basename(out_file)] = {"key": key}
+            with atomic_write(self.path, overwrite=True) as f:
+                json.dump(self.parts, f, indent=4)
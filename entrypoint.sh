@@ -36,6 +36,10 @@ if [[ $1 == "--idle" ]]; then
         sleep 60
         printf "."
     done
+elif [[ $1 == "--daemon" ]]; then
+    # Keep browsers logged in and take download jobs from /config/spool.
+    shift
+    exec gosu "$username" python3 -u daemon.py /config/config.json "$@"
 else
     # Drop privileges (-u to unbuffer, line by line is better for us)
     exec gosu "$username" python3 -u interactive.py /config/config.json "$@"
@@ -1,15 +1,24 @@
 import subprocess
 import os
-import multiprocessing
+import time
+import threading
+import concurrent.futures
 import re
+from encode_cache import EncodeCache
 
-def generate_partslist_m4b(tmp_dir, download_path):
+# Encodes from every book share one pool of threads, each waiting on one
+# ffmpeg, so the machine never runs more encoders than it has CPUs for.
+_encode_executor = None # (ThreadPoolExecutor, threads per ffmpeg), see encode_executor()
+_encode_executor_lock = threading.Lock()
+
+def generate_partslist(tmp_dir, download_path, ext='.m4b'):
     """
-    Generate a FFmpeg-compatible part list for .m4b files in the download directory.
+    Generate a FFmpeg-compatible part list for the part files in the download directory.
 
     Args:
         tmp_dir (str): Temporary directory to save the part list file.
-        download_path (str): Directory containing .m4b files.
+        download_path (str): Directory containing the part files.
+        ext (str): Extension of the part files, '.m4b' or '.mp3'.
 
     Returns:
         str: Path to the generated partlist.txt file.
@@ -20,9 +29,9 @@ def generate_partslist_m4b(tmp_dir, download_path):
         match = re.search(r'(\d+)', filename)
         return int(match.group(1)) if match else -1
 
-    # Collect and sort .m4b files based on part number
+    # Collect and sort part files based on part number
     sorted_files = sorted(
-        [file for file in os.listdir(download_path) if file.endswith('.m4b')],
+        [file for file in os.listdir(download_path) if re.fullmatch(r'part\d+' + re.escape(ext), file)],
         key=extract_partnum
     )
 
@@ -53,48 +62,156 @@ def get_mp3_files(download_path):
 
     return mp3files
     
-def concat_m4b(tmp_dir, download_path, out_file):
+def finalize_audiobook(tmp_dir, out_file, chapter_file, cover_file, part_ext='.m4b', audio_args=('-c:a', 'copy'), format_args=()):
     """
-    Concatenate multiple .m4b files using FFmpeg.
+    Joins the parts and attaches metadata, chapter markers and the cover image
+    in a single FFmpeg run, so the audio is only written once.
 
     Args:
-        tmp_dir (str): Temporary directory.
-        download_path (str): Directory with .m4b parts.
-        out_file (str): Output filename for the concatenated file.
+        tmp_dir (str): Temporary directory holding the parts and metadata file.
+        out_file (str): Path of the finished audiobook file.
+        chapter_file (str): Metadata file with chapter info.
+        cover_file (str): Path to the cover image file, left out if missing.
+        part_ext (str): Extension of the parts to join, '.m4b' or '.mp3'.
+        audio_args (tuple): FFmpeg options for the audio stream.
+        format_args (tuple): FFmpeg options for the output container.
 
     Returns:
         bool: True if FFmpeg executed successfully, False otherwise.
     """
-    partlist_file = generate_partslist_m4b(tmp_dir, download_path)
-    out_file = os.path.join(tmp_dir, out_file)
+    partlist_file = generate_partslist(tmp_dir, tmp_dir, part_ext)
+    chapter_file = os.path.join(tmp_dir, chapter_file)
+    # Ensure cover_file is properly handled (it might be an absolute path already)
+    if cover_file and not os.path.isabs(cover_file):
+        cover_file = os.path.join(tmp_dir, cover_file)
+    has_cover = bool(cover_file) and os.path.isfile(cover_file)
+    if not has_cover:
+        print("Warning: no cover image, finishing without one")
+
+    command = [
+        'ffmpeg', 
+        '-y', 
+        '-f', 'concat', 
+        '-safe', '0', 
+        '-i', partlist_file, 
+        '-i', chapter_file, 
+    ]
+    if has_cover:
+        command += ['-i', cover_file]
+    command += ['-map', '0:a']
+    if has_cover:
+        command += ['-map', '2']
+    command += [
+        '-map_metadata', '1', 
+        '-map_chapters', '1', 
+        *audio_args,
+    ]
+    if has_cover:
+        command += ['-c:v', 'copy', '-disposition:v:0', 'attached_pic']
+    command += [*format_args, out_file]
 
     try:
-        result = subprocess.run([
-            'ffmpeg', 
-            '-y', 
-            '-f', 'concat', 
-            '-safe', '0', 
-            '-i', partlist_file, 
-            '-c', 'copy', out_file
-        ], check=False)
-        
-        return result.returncode in [0, 1] # FFmpeg sometimes returns 1 for non-critical warnings
+        result = subprocess.run(command, check=False, stderr=subprocess.PIPE, text=True, errors='replace')
+        if result.returncode != 0:
+            # The end of FFmpeg's log holds the reason it stopped.
+            print(f"FFmpeg failed with exit code {result.returncode}:")
+            print("\n".join(result.stderr.splitlines()[-20:]))
+            return False
+        return True
     except Exception as e:
-        print(f"Error concatenating AAC files: {e}")
+        print(f"Error finalizing audiobook: {e}")
         return False
-    
-def encode_aac(args):
+
+def remux_mp3(tmp_dir, out_file, chapter_file, cover_file, container='m4b'):
+    """
+    Joins the MP3 parts without re-encoding them, into an M4B with the MP3
+    stream inside, or into a single chaptered MP3 for players that can't
+    read MP3 in an MP4 container.
+
+    Args:
+        tmp_dir (str): Temporary directory holding the parts and metadata file.
+        out_file (str): Path of the finished file, without extension.
+        chapter_file (str): Metadata file with chapter info.
+        cover_file (str): Path to the cover image file.
+        container (str): 'm4b', or 'mp3' for the single MP3 file.
+
+    Returns:
+        str or None: Path of the file created, or None if FFmpeg failed.
+    """
+    if container == 'm4b':
+        # The ipod muxer FFmpeg picks for .m4b has no MP3 support, the mp4 one does.
+        if finalize_audiobook(tmp_dir, out_file + '.m4b', chapter_file, cover_file, '.mp3', ('-c:a', 'copy'), ('-f', 'mp4')):
+            return out_file + '.m4b'
+        print("Could not put the MP3 stream into M4B, writing a chaptered MP3 instead")
+        if os.path.exists(out_file + '.m4b'):
+            os.unlink(out_file + '.m4b')
+
+    # ID3v2.3 carries the chapters (CHAP frames) and cover most widely understood.
+    if finalize_audiobook(tmp_dir, out_file + '.mp3', chapter_file, cover_file, '.mp3', ('-c:a', 'copy'), ('-f', 'mp3', '-id3v2_version', '3')):
+        return out_file + '.mp3'
+    return None
+
+def available_cpus() -> float:
+    """
+    Returns how many CPUs this process may use: the cgroup CPU quota when run
+    in a limited container, otherwise the CPUs it is allowed to run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1, a quota of -1 means unlimited
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    return min(cpus, quota) if quota else cpus
+
+def plan_encoders(num_workers=0, num_threads=0) -> tuple[int, int]:
+    """
+    Decides how many ffmpeg encoders to run at once and how many threads each may use.
+
+    Args:
+        num_workers (int): Encoders wanted, 0 for one per CPU; never more than the CPUs available.
+        num_threads (int): Threads per encoder, 0 to share the CPUs out between the encoders.
+
+    Returns:
+        tuple: (encoders, threads per encoder)
+    """
+    cpus = max(1, int(available_cpus()))
+    workers = min(num_workers, cpus) if num_workers else cpus
+    threads = num_threads or max(1, cpus // workers)
+    return workers, threads
+
+def encode_aac(tmp_dir, in_file, lq, threads=1, cache=None):
     """
     Convert an MP3 file to M4B using FFmpeg with optional low quality.
 
     Args:
-        args (tuple): (tmp_dir, in_file_path, lq) where lq is 1 for low quality.
+        tmp_dir (str): Directory holding the file.
+        in_file (str): MP3 file name or path.
+        lq (int): 1 for low quality, 0 for standard.
+        threads (int): Threads ffmpeg may use.
+        cache (EncodeCache): Skips the encode if a valid output from the same source and settings exists.
 
     Returns:
         bool: True if encoding succeeds, False otherwise.
     """
-    tmp_dir, in_file, lq = args
-
     # Check if lq is 1 and set the bitrate accordingly
     if lq==1:
         bitrate = '32k'
@@ -102,31 +219,63 @@ def encode_aac(args):
         bitrate = '64k'
 
     in_file = os.path.join(tmp_dir, in_file)
-    out_file = os.path.join(tmp_dir, in_file.replace('.mp3', '.m4b'))
+    name = os.path.splitext(os.path.basename(in_file))[0]
+    out_file = os.path.join(tmp_dir, name + '.m4b')
+    # Written under another name first, a stopped encode never looks finished.
+    encoding_file = os.path.join(tmp_dir, name + '.encoding.m4b')
 
-    print(f"Converting: {in_file} -> {out_file}")
+    # Everything that changes the output, so other settings never reuse it.
+    params = {'codec': 'aac', 'bitrate': bitrate, 'sample_rate': 44100, 'channels': 2, 'profile': 'aac_low'}
 
     try:
-        result = subprocess.run([
+        if cache:
+            checksum, source_duration = cache.source_info(in_file)
+            key = cache.key(checksum, params)
+            if cache.is_valid(out_file, key, source_duration):
+                print(f"Already encoded: {in_file} -> {out_file}")
+                return True
+
+        print(f"Converting: {in_file} -> {out_file}")
+        start = time.monotonic()
+        with subprocess.Popen([
             'ffmpeg', 
             '-y', 
+            '-threads', str(threads), # Decoder threads
             '-i', in_file, 
             '-c:a', 'aac', 
-            '-b:a', bitrate,  # Set bitrate based on lq
-            '-ar', '44100', # Maintain 44.1kHz sample rate
-            '-ac', '2',     # Ensure stereo output (2 channels) - is this necessary?
-            '-profile:a', 'aac_low', # Use AAC-LC profile for compatibility
-            out_file
-        ], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            '-b:a', params['bitrate'],  # Set bitrate based on lq
+            '-ar', str(params['sample_rate']), # Maintain 44.1kHz sample rate
+            '-ac', str(params['channels']),     # Ensure stereo output (2 channels) - is this necessary?
+            '-profile:a', params['profile'], # Use AAC-LC profile for compatibility
+            '-threads', str(threads), # Encoder and filter threads
+            encoding_file
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as process:
+            log = process.stderr.read().decode(errors='replace')
+            # wait4 gives the CPU time of this ffmpeg alone, even with others running.
+            _, status, usage = os.wait4(process.pid, 0)
+        returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.monotonic() - start
+        cpu = usage.ru_utime + usage.ru_stime
         
-        print(f"Finished: {in_file} -> {out_file}")
-
-        return result.returncode == 0 or result.returncode == 1
+        print(f"Finished: {in_file} -> {out_file} in {elapsed:.1f}s, CPU {cpu / elapsed * 100 if elapsed else 0:.0f}% ({threads} thread(s))")
+
+        if returncode != 0:
+            print(f"FFmpeg failed with exit code {returncode}: {in_file}")
+            print("\n".join(log.splitlines()[-20:]))
+            return False
+        os.replace(encoding_file, out_file)
+        if cache:
+            cache.record(out_file, key)
+        return True
     except Exception as e:
         print(f"Error encoding AAC: {e}")
         return False
+    finally:
+        # Whatever a failed encode left behind is of no use.
+        if os.path.exists(encoding_file):
+            os.unlink(encoding_file)
     
-def encode_aac_multiprocessing(tmp_dir, download_path, lq=0, num_processes=4):
+def encode_aac_parallel(tmp_dir, download_path, lq=0, num_workers=0, num_threads=0):
     """
     Encode all MP3 files in parallel to M4B format.
 
@@ -134,7 +283,8 @@ def encode_aac_multiprocessing(tmp_dir, download_path, lq=0, num_processes=4):
         tmp_dir (str): Temporary directory.
         download_path (str): Directory with .mp3 files.
         lq (int): 1 for low quality, 0 for standard.
-        num_processes (int): Number of worker processes.
+        num_workers (int): Number of encoders, 0 for one per CPU.
+        num_threads (int): Threads per encoder, 0 to share the CPUs out.
 
     Returns:
         bool: True if all files were encoded.
@@ -142,51 +292,71 @@ def encode_aac_multiprocessing(tmp_dir, download_path, lq=0, num_processes=4):
     mp3Files = get_mp3_files(download_path)
     print(f"{len(mp3Files)} MP3 file(s) found")
 
-    args = [(tmp_dir, mp3, lq) for mp3 in mp3Files]
-
-    with multiprocessing.Pool(processes=min(num_processes, len(mp3Files))) as pool:
-        pool.map(encode_aac, args)
-
-    print("All files encoded")
-    return True
+    encoder = StreamingEncoder(tmp_dir, lq, num_workers, num_threads)
+    for mp3 in mp3Files:
+        encoder.submit(mp3)
+    return encoder.finish()
 
 
-def encode_metadata(tmp_dir, in_file, out_file, chapter_file, cover_file):
+def encode_executor(num_workers=0, num_threads=0) -> tuple[concurrent.futures.ThreadPoolExecutor, int]:
     """
-    Attach metadata, chapter markers, and cover image to the final M4B file using FFmpeg.
+    Returns the process-wide pool that runs encodes, creating it on first use.
+
+    The pool is sized once, from the settings of the first call, since every
+    book in a process shares the same CPUs; later calls get that same pool and
+    thread budget whatever they ask for.
 
     Args:
-        tmp_dir (str): Temporary directory.
-        in_file (str): Input M4B filename.
-        out_file (str): Output M4B filename with metadata.
-        chapter_file (str): Metadata file with chapter info.
-        cover_file (str): Path to the cover image file.
+        num_workers (int): Number of ffmpeg processes run at once, 0 for one per CPU.
+        num_threads (int): Threads per ffmpeg, 0 to share the CPUs out.
 
     Returns:
-        bool: True if metadata attachment succeeds, False otherwise.
+        tuple: The shared ThreadPoolExecutor, each thread waiting on one ffmpeg,
+            and the number of threads each of those ffmpeg may use.
     """
-    in_file = os.path.join(tmp_dir, in_file)
-    chapter_file = os.path.join(tmp_dir, chapter_file)
-    # Ensure cover_file is properly handled (it might be an absolute path already)
-    if not os.path.isabs(cover_file):
-        cover_file = os.path.join(tmp_dir, cover_file)
-
-    try:
-        result = subprocess.run([
-            'ffmpeg', 
-            '-y', 
-            '-i', in_file, 
-            '-i', cover_file, 
-            '-i', chapter_file, 
-            '-map', '0', '-map', '1', 
-            '-map_metadata', '2', 
-            '-map_chapters', '2', 
-            '-c', 'copy', 
-            '-disposition:1', 'attached_pic', 
-            out_file
-        ], check=False)
-        
-        return result.returncode == 0 or result.returncode == 1
-    except Exception as e:
-        print(f"Error encoding metadata: {e}")
-        return False
+    global _encode_executor
+    with _encode_executor_lock:
+        if _encode_executor is None:
+            workers, threads = plan_encoders(num_workers, num_threads)
+            print(f"Running up to {workers} encoder(s) with {threads} thread(s) each")
+            _encode_executor = (concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encode"), threads)
+        return _encode_executor
+
+
+class StreamingEncoder:
+    """Encodes a book's MP3 parts to M4B as each one finishes downloading, instead of after the last one."""
+    def __init__(self, tmp_dir, lq=0, num_workers=0, num_threads=0):
+        """
+        Args:
+            tmp_dir (str): Directory the parts are downloaded to and encoded in.
+            lq (int): 1 for low quality, 0 for standard.
+            num_workers (int): Number of encoders shared by all books, 0 for one per CPU.
+            num_threads (int): Threads per encoder, 0 to share the CPUs out.
+        """
+        self.tmp_dir = tmp_dir
+        self.lq = lq
+        self.executor, self.threads = encode_executor(num_workers, num_threads)
+        self.cache = EncodeCache(tmp_dir)
+        self.futures = {} # mp3 path -> Future
+
+    def submit(self, mp3_file):
+        """
+        Queues a completed MP3 part for encoding, once.
+
+        Args:
+            mp3_file (str): Path of the MP3 part.
+        """
+        mp3_file = os.path.abspath(mp3_file)
+        if mp3_file not in self.futures:
+            self.futures[mp3_file] = self.executor.submit(encode_aac, self.tmp_dir, mp3_file, self.lq, self.threads, self.cache)
+
+    def finish(self):
+        """
+        Waits for every queued part to be encoded.
+
+        Returns:
+            bool: True if all parts were encoded.
+        """
+        results = [future.result() for future in self.futures.values()]
+        print(f"Encoding finished for {len(results)} file(s)")
+        return all(results)
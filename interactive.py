@@ -5,13 +5,18 @@ ODMPY-NG: OverDrive audiobook download and conversion tool
 import argparse
 import json
 import os
+import queue
 import string
 import shutil
 import sys
+import threading
 import pathlib
 import ffmetadata
 from scraper import Scraper
+from pipeline import StagePipeline
 import overdrive_download
+import download_client
+import thunder_cache
 import file_conversions
 import convert_metadata
 
@@ -63,26 +68,16 @@ def get_book_by_index(index: int, books: list):
     """
     return next((b for b in books if b["index"] == index), None)
 
-def main():
-    print("Starting ODMPY-NG")
-
-    # Command line parsing
-    parser = argparse.ArgumentParser()
-    parser.add_argument("config_file", type=str, help="Path to config file")
-    parser.add_argument("--id", "-i", type=int, help="Libby ID for a single book to download")
-    parser.add_argument("--retry", "-r", action="store_true", help="Allow retry of stopped downloads (if left in tmp dir)")
-    parser.add_argument("--name-dir", "-n", type=str, help="Fixed subdirectory relative to /downloads to move single downloaded book to")
-    # These two are mutually exclusive
-    exclusive_group = parser.add_mutually_exclusive_group(required=False)
-    exclusive_group.add_argument("--library", "-L", type=int, help="Index of library within config to download from")
-    exclusive_group.add_argument("--site-id", "-s", type=int, help="Site-Id assigned in config to library to download from")
-    args = parser.parse_args()
+def load_config(config_file: str) -> dict:
+    """
+    Loads and validates the user configuration, exiting on errors.
 
-    if not os.path.exists(args.config_file):
-        print(f"Error: Config file '{args.config_file}' not found")
-        sys.exit(1)
+    Args:
+        config_file (str): Path to the JSON config file.
 
-    config_file = args.config_file
+    Returns:
+        dict: The parsed configuration.
+    """
     if os.path.isfile(config_file):
         with open(config_file) as f:
             try:
@@ -99,19 +94,6 @@ def main():
         print(f"Error: Config directory '{config_dir}' not found")
         sys.exit(1)
 
-    downloads_dir = pathlib.Path("/downloads")
-    tmp_base = pathlib.Path("/tmp-downloads")
-    tmp_base.mkdir(parents=True, exist_ok=True)
-
-    cookies = []
-    cookie_file = os.path.join(config_dir, "cookies")
-    if os.path.exists(cookie_file):
-        try:
-            with open(cookie_file) as f:
-                cookies = json.load(f)
-        except Exception as e:
-            print(f"Error loading cookies: {e}")
-
     print("Config loaded")
 
     if config.get("low_quality_encode", 0):
@@ -128,6 +110,368 @@ def main():
         print(f"Error: site-ids must be unique within libraries, please edit {config_file}")
         sys.exit(1)
 
+    return config
+
+def load_cookies(cookie_file: str) -> list:
+    """Loads saved session cookies, or returns [] if there are none."""
+    cookies = []
+    if os.path.exists(cookie_file):
+        try:
+            with open(cookie_file) as f:
+                cookies = json.load(f)
+        except Exception as e:
+            print(f"Error loading cookies: {e}")
+    return cookies
+
+def make_scraper_config(config: dict, library: dict, allow_retry: bool, book_id: int | None = None) -> dict:
+    """
+    Creates a compatible config object for the scraper.
+
+    Args:
+        config (dict): Full user configuration.
+        library (dict): The selected entry of config["libraries"].
+        allow_retry (bool): Whether stopped downloads left in the tmp dir may be resumed.
+        book_id (int): Libby ID of a single book to download, if any.
+
+    Returns:
+        dict: Scraper configuration.
+    """
+    return {
+        "library": library["url"],
+        "user": library["card_number"],
+        "pass": library["pin"],
+        "tmp-dir": None, # to be filled in later
+        "allow-retry": allow_retry,
+        "id": book_id,
+        "wait-timeout": config.get("player_wait_timeout", 0.5),
+        "wait-settle": config.get("player_wait_settle", 0.2),
+        "download-workers": config.get("download_workers", 2),
+        "download-segments": config.get("download_segments", 1),
+        "predict-parts": config.get("predict_part_urls", 0),
+        "direct-seek": config.get("direct_seek", 1),
+        "seek-selector": config.get("seek_selector", ".timeline-bar"),
+        "chromedriver-path": config.get("chromedriver_path"),
+        "chromedriver-cache": config.get("chromedriver_cache"),
+        "reuse-captured": config.get("reuse_captured_audio", 0),
+        "block-resources": config.get("block_resources", 0),
+        "blocked-urls": config.get("blocked_urls"),
+    }
+
+def needs_encode(config: dict) -> bool:
+    """Whether the configured output needs the MP3 parts encoded to AAC."""
+    return not config.get("skip_reencode", 0) and not config.get("remux_mp3", 0)
+
+def scrape_book(scraper: Scraper, book: dict, config: dict, scraper_config: dict, tmp_base: pathlib.Path) -> dict | None:
+    """
+    Pipeline stage: downloads a book's parts and cover into its tmp dir.
+
+    Unless disabled, parts are handed to a StreamingEncoder as they finish,
+    so most of the encoding is done by the time the download is.
+
+    Args:
+        scraper (Scraper): Logged-in scraper to fetch the book with.
+        book (dict): Loan entry from Scraper.get_loans(), plus a 'name_dir' if given.
+        config (dict): Full user configuration.
+        scraper_config (dict): The scraper's configuration, 'tmp-dir' is filled in here.
+        tmp_base (Path): Base directory for per-book tmp dirs.
+
+    Returns:
+        dict: The book with 'tmp_dir', 'chapter_markers' and 'expected_length' added, or None on failure.
+    """
+    # Create tmp directory with absolute path, one for each book.
+    tmp_dir = tmp_base / book["id"]
+    scraper_config["tmp-dir"] = str(tmp_dir)
+    if os.path.exists(tmp_dir) and not scraper_config.get("allow-retry"):
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Accessing {book['title']}, ID: {book['id']}")
+
+    encoder = None
+    if needs_encode(config) and config.get("streaming_encode", 1):
+        encoder = file_conversions.StreamingEncoder(tmp_dir, config.get("low_quality_encode", 0), config.get("encoder_count", 0), config.get("encoder_threads", 0))
+
+    # Use scraper.py to download book
+    book_data = scraper.get_book(book["link"], tmp_dir, encoder.submit if encoder else None)
+
+    if not book_data:
+        print("Failed to download")
+        return None
+
+    book["tmp_dir"] = tmp_dir
+    book["encoder"] = encoder
+    book["chapter_markers"], book["expected_length"] = book_data
+    return book
+
+def fetch_book_metadata(book: dict, config: dict, downloads_dir: pathlib.Path) -> dict:
+    """
+    Pipeline stage: creates the book's download directory and fetches its Thunder metadata if configured.
+
+    Args:
+        book (dict): The book as returned by scrape_book().
+        config (dict): Full user configuration.
+        downloads_dir (Path): Base directory for finished books.
+
+    Returns:
+        dict: The book with 'download_path' added.
+    """
+    filter_table = str.maketrans(dict.fromkeys(string.punctuation))
+
+    if book.get("name_dir"):
+        download_path = os.path.abspath(os.path.join(downloads_dir, book["name_dir"]))
+    else:
+        # Filter to remove punctuation from book title/author for file path
+        download_path = os.path.abspath(os.path.join(
+            downloads_dir, 
+            book["author"].translate(filter_table), 
+            book["title"].translate(filter_table)
+        ))
+
+    os.makedirs(download_path, exist_ok=True)
+    book["download_path"] = download_path
+
+    if config.get("download_thunder_metadata", 0) or config.get("convert_audiobookshelf_metadata", 0):
+        # Both of these require thunder metadata.
+        metadata_path = os.path.abspath(os.path.join(download_path, 'info.json'))
+        chapters_path = os.path.abspath(os.path.join(download_path, 'chapters.json'))
+        with open(chapters_path, 'w') as f:
+            json.dump(book["chapter_markers"], f)
+        if overdrive_download.download_thunder_metadata(book["id"], metadata_path):
+            print("Downloaded json metadata")
+            if config.get("convert_audiobookshelf_metadata", 0):
+                convert_metadata.convert_file(metadata_path, book["expected_length"])
+                print("Provided audiobookshelf metadata")
+                if not config.get("download_thunder_metadata", 0):
+                    os.unlink(metadata_path)
+                    os.unlink(chapters_path)
+                    print("Cleaned up json metadata")
+    return book
+
+def encode_book(book: dict, config: dict) -> dict | None:
+    """
+    Pipeline stage: encodes the book's MP3 parts to AAC (or waits for its streaming encoder), unless re-encoding is skipped.
+
+    Args:
+        book (dict): The book as returned by fetch_book_metadata().
+        config (dict): Full user configuration.
+
+    Returns:
+        dict: The book, or None if a part failed to encode.
+    """
+    if book.get("encoder"):
+        # Only the parts still encoding are waited for.
+        success = book["encoder"].finish()
+    elif needs_encode(config):
+        tmp_dir = book["tmp_dir"]
+        success = file_conversions.encode_aac_parallel(tmp_dir, tmp_dir, config.get("low_quality_encode", 0), config.get("encoder_count", 0), config.get("encoder_threads", 0))
+    else:
+        return book
+
+    if not success:
+        # Joining the rest would make a book with parts missing.
+        print(f"ERROR: Some parts failed to encode, temporary files kept for --retry: {book['tmp_dir']}")
+        return None
+    print("Converted all files to AAC M4B")
+    return book
+
+def finalize_book(book: dict, config: dict) -> dict | None:
+    """
+    Pipeline stage: builds the finished audiobook (or copies the MP3 parts) and removes the tmp dir.
+
+    Args:
+        book (dict): The book as returned by encode_book().
+        config (dict): Full user configuration.
+
+    Returns:
+        dict: The book, or None if the audiobook couldn't be created.
+    """
+    tmp_dir = book["tmp_dir"]
+    download_path = book["download_path"]
+
+    if config.get("skip_reencode", 0):
+        # Just copy the audio and cover to the dest, leaving scraper state behind.
+        source, dest = pathlib.Path(tmp_dir), pathlib.Path(download_path)
+        for p in source.iterdir():
+            if p.suffix in (".mp3", ".jpg"):
+                shutil.copy(p, dest)
+    else:
+        print("Generating metadata")
+        ffmetadata.write_metafile(tmp_dir, book["chapter_markers"], book["title"], book["author"], book["expected_length"])
+
+        print("Joining parts and adding metadata to audiobook")
+        cover_path = os.path.abspath(os.path.join(tmp_dir, "cover.jpg"))
+
+        filter_table = str.maketrans(dict.fromkeys(string.punctuation))
+        sanitized_title = book["title"].translate(filter_table).replace(" ", "")
+        output_file = os.path.abspath(os.path.join(download_path, sanitized_title + ".m4b"))
+
+        if config.get("remux_mp3", 0):
+            # The original MP3 audio, just joined into one chaptered file.
+            output_file = file_conversions.remux_mp3(tmp_dir, os.path.splitext(output_file)[0], "ffmetadata", cover_path, config.get("remux_container", "m4b"))
+            success = output_file is not None
+        else:
+            success = file_conversions.finalize_audiobook(tmp_dir, output_file, "ffmetadata", cover_path)
+        if success:
+            print(f"Finished file created: {output_file}")
+        else:
+            print(f"ERROR: Could not create the audiobook, temporary files kept for --retry: {tmp_dir}")
+            return None
+
+    # Clean up temporary files
+    try:
+        shutil.rmtree(tmp_dir)
+        print("Temporary files cleaned up")
+    except Exception as e:
+        print(f"Warning: Could not remove temporary directory: {e}")
+
+    return book
+
+def download_book(scraper: Scraper, book_selection: dict, config: dict, scraper_config: dict,
+                  downloads_dir: pathlib.Path, tmp_base: pathlib.Path, name_dir: str | None = None) -> bool:
+    """
+    Scrapes, downloads and converts one book into the downloads directory, running the stages in turn.
+
+    Args:
+        scraper (Scraper): Logged-in scraper to fetch the book with.
+        book_selection (dict): Loan entry from Scraper.get_loans().
+        config (dict): Full user configuration.
+        scraper_config (dict): The scraper's configuration, 'tmp-dir' is filled in here.
+        downloads_dir (Path): Base directory for finished books.
+        tmp_base (Path): Base directory for per-book tmp dirs.
+        name_dir (str): Fixed subdirectory of downloads_dir to use instead of author/title.
+
+    Returns:
+        bool: True if the book was downloaded.
+    """
+    book = scrape_book(scraper, dict(book_selection, name_dir=name_dir), config, scraper_config, tmp_base)
+    if not book:
+        return False
+    book = fetch_book_metadata(book, config, downloads_dir)
+    book = encode_book(book, config)
+    if not book:
+        return False
+    return finalize_book(book, config) is not None
+
+def download_books_pipelined(scraper: Scraper, book_selections: list, config: dict, scraper_config: dict,
+                             downloads_dir: pathlib.Path, tmp_base: pathlib.Path, name_dir: str | None = None) -> bool:
+    """
+    Downloads books through a stage pipeline, so the browser scrapes the next
+    book while the previous one is still being encoded and finalized.
+
+    Args:
+        scraper (Scraper): Logged-in scraper to fetch the books with.
+        book_selections (list): Loan entries from Scraper.get_loans() to download.
+        config (dict): Full user configuration.
+        scraper_config (dict): The scraper's configuration.
+        downloads_dir (Path): Base directory for finished books.
+        tmp_base (Path): Base directory for per-book tmp dirs.
+        name_dir (str): Fixed subdirectory of downloads_dir, only for a single book.
+
+    Returns:
+        bool: True if every book made it through all the stages.
+    """
+    stages = StagePipeline([
+        ("scrape", lambda book: scrape_book(scraper, book, config, scraper_config, tmp_base)),
+        ("metadata", lambda book: fetch_book_metadata(book, config, downloads_dir)),
+        ("encode", lambda book: encode_book(book, config)),
+        ("finalize", lambda book: finalize_book(book, config)),
+    ], config.get("pipeline_queue_size", 1))
+    try:
+        for book_selection in book_selections:
+            stages.put(dict(book_selection, name_dir=name_dir))
+    finally:
+        stages.close()
+    stages.report()
+    print(f"Downloads: {download_client.client.summary()}")
+    return not stages.failed
+
+def download_books_parallel(scraper: Scraper, book_selections: list, workers: int, cookies: list, config: dict,
+                            scraper_config: dict, downloads_dir: pathlib.Path, tmp_base: pathlib.Path) -> bool:
+    """
+    Downloads several books at once, each browser worker pulling books from a shared queue.
+
+    Every worker has its own Scraper (and so its own Chrome with a private
+    temporary profile) logged in with the already validated cookies; the
+    given scraper is reused as the first worker.
+
+    Args:
+        scraper (Scraper): Logged-in scraper, used as the first worker.
+        book_selections (list): Loan entries from Scraper.get_loans() to download.
+        workers (int): Number of browsers to run.
+        cookies (list): Validated session cookies shared by all workers.
+        config (dict): Full user configuration.
+        scraper_config (dict): Scraper configuration, copied for each worker.
+        downloads_dir (Path): Base directory for finished books.
+        tmp_base (Path): Base directory for per-book tmp dirs.
+
+    Returns:
+        bool: True if every book was downloaded.
+    """
+    jobs = queue.Queue()
+    for book_selection in book_selections:
+        jobs.put(book_selection)
+    downloaded = [] # books that made it, left short by failures and books no worker got to
+    downloaded_lock = threading.Lock()
+
+    def worker(worker_num: int):
+        worker_config = dict(scraper_config)
+        worker_scraper = scraper if worker_num == 0 else Scraper(worker_config)
+        try:
+            if worker_num and not worker_scraper.ensure_login(cookies):
+                print(f"Worker {worker_num}: sign in failed")
+                return
+            while True:
+                try:
+                    book_selection = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    if download_book(worker_scraper, book_selection, config, worker_config, downloads_dir, tmp_base):
+                        with downloaded_lock:
+                            downloaded.append(book_selection)
+                except (Exception, SystemExit) as e:
+                    # The scraper exits on errors, which mustn't stop the other books.
+                    print(f"Worker {worker_num}: failed to download {book_selection['title']}: {e!r}")
+        finally:
+            if worker_num and worker_scraper.driver:
+                worker_scraper.driver.quit()
+                worker_scraper.driver = None
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"browser-{i}") for i in range(min(workers, len(book_selections)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Downloads: {download_client.client.summary()}")
+    return len(downloaded) == len(book_selections)
+
+def main():
+    print("Starting ODMPY-NG")
+
+    # Command line parsing
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config_file", type=str, help="Path to config file")
+    parser.add_argument("--id", "-i", type=int, help="Libby ID for a single book to download")
+    parser.add_argument("--retry", "-r", action="store_true", help="Allow retry of stopped downloads (if left in tmp dir)")
+    parser.add_argument("--name-dir", "-n", type=str, help="Fixed subdirectory relative to /downloads to move single downloaded book to")
+    # These two are mutually exclusive
+    exclusive_group = parser.add_mutually_exclusive_group(required=False)
+    exclusive_group.add_argument("--library", "-L", type=int, help="Index of library within config to download from")
+    exclusive_group.add_argument("--site-id", "-s", type=int, help="Site-Id assigned in config to library to download from")
+    args = parser.parse_args()
+
+    config_file = args.config_file
+    config = load_config(config_file)
+    download_client.configure(config)
+    thunder_cache.configure(config, os.path.join(os.path.dirname(config_file), "thunder-cache"))
+    cookie_file = os.path.join(os.path.dirname(config_file), "cookies")
+    cookies = load_cookies(cookie_file)
+    libraries = config["libraries"]
+
+    downloads_dir = pathlib.Path("/downloads")
+    tmp_base = pathlib.Path("/tmp-downloads")
+    tmp_base.mkdir(parents=True, exist_ok=True)
+
     library_index = None
     print("\nAvailable libraries:")
     for i, library in enumerate(libraries):
@@ -169,14 +513,7 @@ def main():
 
     # Create a compatible config object for the scraper
     selected_library = libraries[library_index]
-    scraper_config = {
-        "library": selected_library["url"],
-        "user": selected_library["card_number"],
-        "pass": selected_library["pin"],
-        "tmp-dir": None, # to be filled in later
-        "allow-retry": args.retry,
-        "id": args.id,
-    }
+    scraper_config = make_scraper_config(config, selected_library, args.retry, args.id)
     os.makedirs(downloads_dir, mode=0o755, exist_ok=True)
         
     print(f"Using library: {selected_library['name']}")
@@ -215,97 +552,30 @@ def main():
         print("ERROR: Cannot use --name-dir with multiple books")
         sys.exit(1)
 
-    # For each selected book, get the data
+    if config.get("download_thunder_metadata", 0) or config.get("convert_audiobookshelf_metadata", 0):
+        # Fetched in the background while the browser works on the audio.
+        thunder_cache.cache.prefetch([b["id"] for title_index in title_selections if (b := get_book_by_index(title_index, books))])
+
+    # Several books can be fetched by a pool of browsers
+    browser_workers = config.get("browser_workers", 1)
+    if browser_workers > 1 and len(title_selections) > 1:
+        book_selections = [b for title_index in title_selections if (b := get_book_by_index(title_index, books))]
+        if not download_books_parallel(scraper, book_selections, browser_workers, cookies, config, scraper_config, downloads_dir, tmp_base):
+            sys.exit(3)
+        title_selections = []
+
+    # Each selected book goes through the stage pipeline
+    book_selections = []
     for title_index in title_selections:
         # Get book selection from index
         book_selection = get_book_by_index(title_index, books)
         if not book_selection:
             print(f"ERROR: Invalid book selection, should not happen: {title_index}")
             continue
+        book_selections.append(book_selection)
 
-        # Create tmp directory with absolute path, one for each book.
-        tmp_dir = tmp_base / book_selection["id"]
-        scraper_config["tmp-dir"] = str(tmp_dir)
-        if os.path.exists(tmp_dir) and not scraper_config.get("allow-retry"):
-            shutil.rmtree(tmp_dir)
-        tmp_dir.mkdir(parents=True, exist_ok=True)
-
-        print(f"Accessing {book_selection['title']}, ID: {book_selection['id']}")
-
-        # Use scraper.py to download book
-        book_data = scraper.get_book(book_selection["link"], tmp_dir)
-
-        if not book_data:
-            print("Failed to download")
-            continue
-
-        # Reformat returned tuple for easier readability
-        book_title = book_selection["title"]
-        book_author = book_selection["author"]
-        book_chapter_markers, book_expected_length = book_data
-
-        # Save current cookies for upcoming downloads
-        cookies = scraper.get_cookies()
-        filter_table = str.maketrans(dict.fromkeys(string.punctuation))
-
-        if args.name_dir:
-            download_path = os.path.abspath(os.path.join(downloads_dir, args.name_dir))
-        else:
-            # Filter to remove punctuation from book title/author for file path
-            download_path = os.path.abspath(os.path.join(
-                downloads_dir, 
-                book_author.translate(filter_table), 
-                book_title.translate(filter_table)
-            ))
-
-        os.makedirs(download_path, exist_ok=True)
-
-        if config.get("download_thunder_metadata", 0) or config.get("convert_audiobookshelf_metadata", 0):
-            # Both of these require thunder metadata.
-            metadata_path = os.path.abspath(os.path.join(download_path, 'info.json'))
-            chapters_path = os.path.abspath(os.path.join(download_path, 'chapters.json'))
-            with open(chapters_path, 'w') as f:
-                json.dump(book_chapter_markers, f)
-            if overdrive_download.download_thunder_metadata(book_selection["id"], metadata_path):
-                print("Downloaded json metadata")
-                if config.get("convert_audiobookshelf_metadata", 0):
-                    convert_metadata.convert_file(metadata_path, book_expected_length)
-                    print("Provided audiobookshelf metadata")
-                    if not config.get("download_thunder_metadata", 0):
-                        os.unlink(metadata_path)
-                        os.unlink(chapters_path)
-                        print("Cleaned up json metadata")
-
-        if config.get("skip_reencode", 0):
-            # Just copy everything to the dest.
-            source, dest = pathlib.Path(tmp_dir), pathlib.Path(download_path)
-            for p in source.iterdir():
-                shutil.copy(p, dest)
-        else:
-            if file_conversions.encode_aac_multiprocessing(tmp_dir, tmp_dir, config.get("low_quality_encode", 0), config.get("encoder_count", 4)):
-                print("Converted all files to AAC M4B")
-
-            if file_conversions.concat_m4b(tmp_dir, tmp_dir, 'temp.m4b'):
-                print("Converted to single M4B")
-
-            print("Generating metadata")
-            ffmetadata.write_metafile(tmp_dir, book_chapter_markers, book_title, book_author, book_expected_length)
-
-            print("Adding metadata to audiobook")
-            cover_path = os.path.abspath(os.path.join(tmp_dir, "cover.jpg"))
-
-            sanitized_title = book_title.translate(filter_table).replace(" ", "")
-            output_file = os.path.abspath(os.path.join(download_path, sanitized_title + ".m4b"))
-
-            if file_conversions.encode_metadata(tmp_dir, "temp.m4b", output_file, "ffmetadata", cover_path):
-                print("Finished file created")
-
-        # Clean up temporary files
-        try:
-            shutil.rmtree(tmp_dir)
-            print("Temporary files cleaned up")
-        except Exception as e:
-            print(f"Warning: Could not remove temporary directory: {e}")
+    if book_selections and not download_books_pipelined(scraper, book_selections, config, scraper_config, downloads_dir, tmp_base, args.name_dir):
+        sys.exit(3)
 
     del scraper
 
@@ -0,0 +1,112 @@
+from mutagen.mp3 import MPEGInfo
+
+# mutagen looks for the first frames in the 1 MiB after the ID3 tags, and
+# may read a few frames (up to ~3 KiB each) past that.
+HEADER_READ = 1024*1024 + 64*1024
+
+class _StreamHead:
+    """File-like view of the start of a stream whose full size is known, enough for mutagen's MPEGInfo."""
+    def __init__(self, head: bytes, size: int):
+        self.head = head
+        self.size = size
+        self.pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self.head) if n < 0 else self.pos + n
+        data = self.head[self.pos:end]
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.pos = max(0, (0, self.pos, self.size)[whence] + offset)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+def id3_end(data: bytes) -> int | None:
+    """
+    Finds where the (possibly stacked) ID3v2 tags at the start of an MP3 end.
+
+    Args:
+        data (bytes): The start of the file.
+
+    Returns:
+        int or None: Offset of the first byte after the tags, or None if more data is needed to tell.
+    """
+    pos = 0
+    while True:
+        if len(data) < pos + 10:
+            return None
+        if data[pos:pos+3] != b'ID3':
+            return pos
+        # Tag size is a 28 bit "syncsafe" integer, 7 bits per byte.
+        size = 0
+        for byte in data[pos+6:pos+10]:
+            size = (size << 7) | (byte & 0x7f)
+        if not size:
+            return pos
+        pos += 10 + size
+
+class MP3StreamInfo:
+    """
+    Works out an MP3's duration from its bytes as they are written, so the
+    file doesn't have to be opened and parsed again afterwards.
+
+    Only the ID3 tags and the first MiB of audio are kept, which is all
+    mutagen reads to find the frame, Xing or VBRI headers; the length then
+    comes from those headers or, for plain CBR files, from the total size.
+    Running mutagen's own parser over that data gives the same duration and
+    "sketchy" verdict as get_mp3_duration() on the finished file.
+    """
+    def __init__(self):
+        self.head = bytearray()
+        self.size = 0
+        self.limit = None # bytes of head to keep, known once the ID3 tags are
+
+    def update(self, chunk: bytes):
+        """Feeds the next bytes of the file."""
+        self.size += len(chunk)
+        if self.limit is None or len(self.head) < self.limit:
+            self.head += chunk
+            if self.limit is None and (tags_end := id3_end(self.head)) is not None:
+                self.limit = tags_end + HEADER_READ
+            if self.limit is not None:
+                del self.head[self.limit:]
+
+    def header_complete(self) -> bool:
+        """Whether enough of the file has been seen to check it with check()."""
+        return self.limit is not None and len(self.head) >= self.limit
+
+    def _info(self, size: int | None = None) -> MPEGInfo:
+        return MPEGInfo(_StreamHead(bytes(self.head), size or self.size))
+
+    def check(self):
+        """
+        Checks the start of the file looks like valid MPEG audio, without waiting for the rest.
+
+        Raises:
+            ValueError: If mutagen would consider the file corrupted.
+            mutagen.mp3.HeaderNotFoundError: If no MPEG frames were found.
+        """
+        if self._info().sketchy:
+            raise ValueError("Corrupted MP3 stream")
+
+    def duration(self, size: int | None = None) -> float:
+        """
+        Returns the duration in seconds of all the bytes fed so far.
+
+        Once header_complete(), passing the file's final size gives its final
+        duration before the rest has arrived.
+
+        Args:
+            size (int): Size of the whole file, if known; defaults to the bytes fed so far.
+
+        Raises:
+            ValueError: If mutagen would consider the file corrupted.
+            mutagen.mp3.HeaderNotFoundError: If no MPEG frames were found.
+        """
+        info = self._info(size)
+        if info.sketchy:
+            raise ValueError("Corrupted MP3 stream")
+        return info.length
@@ -1,41 +1,431 @@
 import requests
 import os
+import re
 import json
+import hashlib
+import threading
+import concurrent.futures
 import convert_metadata
-from atomicwrites import atomic_write
+import download_client
+import thunder_cache
+from mp3_stream import MP3StreamInfo
+from mutagen import MutagenError
 
-# Standard headers for web requests to mimic a browser
-headers = {'User-Agent': 'Mozilla/5.0'}
+def parse_content_range(value: str) -> tuple[int, int | None] | None:
+    """
+    Parses a Content-Range header such as 'bytes 100-199/1000'.
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        tuple: (first byte, total size or None if unknown), or None if the header is malformed.
+    """
+    match = re.fullmatch(r'bytes (\d+)-\d+/(\d+|\*)', value.strip())
+    if not match:
+        return None
+    return int(match.group(1)), None if match.group(2) == '*' else int(match.group(2))
 
-def download_mp3_part(url, part_num, download_path: str, cookies: list) -> int:
+def download_mp3_part(url, part_num, download_path: str, cookies: list, manifest=None, on_duration=None) -> int:
     """
     Downloads an MP3 part from the given URL and saves it to the specified path.
+
+    The part is streamed into a .partial file. When the connection drops, or
+    a .partial is left from a stopped run, the download resumes from the end
+    of that file with a Range request. The file only becomes partNN.mp3 once
+    its size matches the size the server announced.
     
     Args:
         url (str): The URL of the MP3 part.
         part_num (int): The part number, used to name the file.
         download_path (str): Directory where the MP3 will be saved.
         cookies (list): List of cookies (dicts) for authentication.
+        manifest (PartManifest): Optional ledger to record the finished part in.
+        on_duration (callable): Called with the part's duration as soon as its
+            headers and size tell it, well before the download finishes.
     
     Returns:
         int: Duration of the downloaded MP3 in seconds, or 0 on failure.
     """
     os.makedirs(download_path, exist_ok=True)
-    cookie_dict = {cookie['name']: cookie['value'] for cookie in cookies}
-
-    print(f"Downloading part {part_num}")
-    response = requests.get(url, headers=headers, cookies=cookie_dict, stream=True)
+    client = download_client.client
 
     fn = f"part{part_num:02d}.mp3"
-    if response.status_code == 200:
-        with atomic_write(os.path.join(download_path, fn), mode="wb", overwrite=True) as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
-        return convert_metadata.get_mp3_duration(os.path.join(download_path, fn))
+    filepath = os.path.join(download_path, fn)
+    partial_path = filepath + ".partial"
+
+    # Bytes already on disk count towards the checksum and duration too.
+    digest, stream_info = hashlib.sha256(), MP3StreamInfo()
+    offset = 0
+    if os.path.isfile(partial_path):
+        with open(partial_path, 'rb') as f:
+            while chunk := f.read(1024*1024):
+                digest.update(chunk)
+                stream_info.update(chunk)
+                offset += len(chunk)
+    checked = False
+
+    print(f"Downloading part {part_num}" + (f", resuming at {offset} bytes" if offset else ""))
+    # One budget of attempts covers failed requests and bodies cut short.
+    for attempt in range(client.retries + 1):
+        try:
+            response = client.get_attempt(url, attempt, cookies, {'Range': f'bytes={offset}-'} if offset else None, stream=True)
+        except requests.RequestException as e:
+            print(f"Failed to download mp3 part {part_num}: {e}")
+            return 0
+        if response is None:
+            continue
+
+        with response:
+            if response.status_code == 416 and offset:
+                # Nothing past the end of the file, it may already be complete.
+                unsatisfied = re.fullmatch(r'bytes \*/(\d+)', response.headers.get('Content-Range', '').strip())
+                if unsatisfied and int(unsatisfied.group(1)) == offset:
+                    total = offset
+                    break
+                print(f"Part {part_num} doesn't match its partial download, starting again")
+                offset, digest, stream_info, checked = 0, hashlib.sha256(), MP3StreamInfo(), False
+                os.unlink(partial_path)
+                continue
+
+            if response.status_code == 206 and offset:
+                content_range = parse_content_range(response.headers.get('Content-Range', ''))
+                if not content_range or content_range[0] != offset or content_range[1] is None:
+                    print(f"Unexpected Content-Range for part {part_num}: {response.headers.get('Content-Range')}")
+                    return 0
+                total = content_range[1]
+            elif response.status_code == 200:
+                if offset:
+                    print(f"Server ignored the range request, downloading part {part_num} from the start")
+                    offset, digest, stream_info, checked = 0, hashlib.sha256(), MP3StreamInfo(), False
+                length = response.headers.get('Content-Length', '')
+                total = int(length) if length.isdigit() else None
+            else:
+                print(f"Failed to download mp3 part with status code {response.status_code}")
+                return 0
+
+            try:
+                with open(partial_path, 'ab' if offset else 'wb') as f:
+                    for chunk in client.iter_body(response):
+                        digest.update(chunk)
+                        stream_info.update(chunk)
+                        f.write(chunk)
+                        offset += len(chunk)
+                        if not checked and stream_info.header_complete():
+                            # Stop early rather than fetch hundreds of MB of junk.
+                            checked = True
+                            stream_info.check()
+                            if on_duration and total:
+                                on_duration(stream_info.duration(total))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except (ValueError, MutagenError) as e:
+                print(f"Part {part_num} is not valid MP3 audio: {e}")
+                os.unlink(partial_path)
+                return 0
+            except download_client.RETRY_ERRORS as e:
+                # Everything written so far is kept, the next request starts after it.
+                if attempt == client.retries:
+                    print(f"Failed to download mp3 part {part_num}: {e}")
+                    return 0
+                print(f"Download of part {part_num} interrupted at {offset} bytes, resuming: {e}")
+                client.wait_before_retry(attempt)
+                continue
+
+            if total is None or offset == total:
+                break
+            print(f"Part {part_num} ended at {offset} of {total} bytes, resuming")
+        if attempt < client.retries:
+            client.wait_before_retry(attempt)
     else:
-        print(f"Failed to download mp3 part with status code {response.status_code}")
+        print(f"Failed to download mp3 part {part_num}: incomplete after {client.retries + 1} attempts")
         return 0
 
+    # Raises on corrupted audio like convert_metadata.get_mp3_duration(), without reading the file again.
+    try:
+        duration = stream_info.duration()
+    except (ValueError, MutagenError):
+        os.unlink(partial_path)
+        raise
+    os.replace(partial_path, filepath)
+    if manifest:
+        manifest.record(fn, duration, digest.hexdigest())
+    return duration
+
+
+def fetch_range(url, cookies: list, filepath: str, start: int, end: int) -> int:
+    """
+    Downloads bytes start..end (inclusive) of a URL into the same place of a preallocated file.
+
+    Args:
+        url (str): The URL to fetch.
+        cookies (list): List of cookies (dicts) for authentication.
+        filepath (str): The preallocated file to write into.
+        start (int): First byte of the range.
+        end (int): Last byte of the range.
+
+    Returns:
+        int: Number of bytes written, less than the range only on failure.
+    """
+    client = download_client.client
+    position = start
+    with open(filepath, 'r+b') as f:
+        for attempt in range(client.retries + 1):
+            response = client.get_attempt(url, attempt, cookies, {'Range': f'bytes={position}-{end}'}, stream=True)
+            if response is None:
+                continue
+            with response:
+                content_range = parse_content_range(response.headers.get('Content-Range', ''))
+                if response.status_code != 206 or not content_range or content_range[0] != position:
+                    print(f"Unexpected response for bytes {position}-{end}: {response.status_code} {response.headers.get('Content-Range')}")
+                    break
+                f.seek(position)
+                try:
+                    for chunk in client.iter_body(response):
+                        f.write(chunk[:end + 1 - position])
+                        position += len(chunk)
+                except download_client.RETRY_ERRORS as e:
+                    if attempt == client.retries:
+                        print(f"Failed to download bytes {position}-{end}: {e}")
+                        break
+                    client.wait_before_retry(attempt)
+                    continue
+            if position > end:
+                break
+    return min(position, end + 1) - start
+
+def download_mp3_part_segmented(url, part_num, download_path: str, cookies: list, segments: int,
+                                min_segment_size: int = 8*1024*1024, manifest=None) -> float:
+    """
+    Downloads an MP3 part as several byte ranges at once, for servers that
+    limit the speed of each connection.
+
+    The ranges are written straight into a preallocated file, which becomes
+    partNN.mp3 once every range has arrived in full. Parts too small to split,
+    servers that ignore ranges, and failed ranges fall back to download_mp3_part(),
+    as do parts with a .partial file left by an earlier run, which it resumes.
+
+    Args:
+        url (str): The URL of the MP3 part.
+        part_num (int): The part number, used to name the file.
+        download_path (str): Directory where the MP3 will be saved.
+        cookies (list): List of cookies (dicts) for authentication.
+        segments (int): Number of ranges to fetch at once.
+        min_segment_size (int): Smallest range worth its own connection, in bytes.
+        manifest (PartManifest): Optional ledger to record the finished part in.
+
+    Returns:
+        float: Duration of the downloaded MP3 in seconds, or 0 on failure.
+    """
+    os.makedirs(download_path, exist_ok=True)
+    fn = f"part{part_num:02d}.mp3"
+    filepath = os.path.join(download_path, fn)
+    # Not .partial, whose resume expects the file to be filled from the start.
+    segments_path = filepath + ".segments"
+    if os.path.isfile(filepath + ".partial"):
+        # Carrying on from where the stream stopped beats fetching it all again.
+        return download_mp3_part(url, part_num, download_path, cookies, manifest)
+
+    content_range = None
+    try:
+        with download_client.client.get(url, cookies, {'Range': 'bytes=0-0'}, stream=True, retry=False) as response:
+            if response.status_code == 206:
+                content_range = parse_content_range(response.headers.get('Content-Range', ''))
+    except requests.RequestException as e:
+        print(f"Failed to check ranges for part {part_num}: {e}")
+    if not content_range or content_range[1] is None:
+        return download_mp3_part(url, part_num, download_path, cookies, manifest)
+
+    total = content_range[1]
+    segments = min(segments, total // min_segment_size)
+    if segments < 2:
+        return download_mp3_part(url, part_num, download_path, cookies, manifest)
+
+    print(f"Downloading part {part_num} in {segments} segments")
+    with open(segments_path, 'wb') as f:
+        f.truncate(total)
+    bounds = [total * i // segments for i in range(segments + 1)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=segments, thread_name_prefix="part-segment") as executor:
+        futures = [executor.submit(fetch_range, url, cookies, segments_path, bounds[i], bounds[i+1] - 1) for i in range(segments)]
+        received = []
+        for future in futures:
+            try:
+                received.append(future.result())
+            except requests.RequestException as e:
+                print(f"Failed to download a segment of part {part_num}: {e}")
+                received.append(0)
+
+    if sum(received) != total or os.path.getsize(segments_path) != total:
+        print(f"Segments of part {part_num} are incomplete, downloading it in one stream")
+        os.unlink(segments_path)
+        return download_mp3_part(url, part_num, download_path, cookies, manifest)
+
+    with open(segments_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(segments_path, filepath)
+    duration = convert_metadata.get_mp3_duration(filepath)
+    if manifest:
+        manifest.record(fn, duration)
+    return duration
+
+
+def use_captured_part(captured_path: str, part_num, download_path: str, manifest=None) -> float:
+    """
+    Moves a part captured in full by the browser proxy into place, instead of downloading it.
+
+    Args:
+        captured_path (str): File holding the captured response body.
+        part_num (int): The part number, used to name the file.
+        download_path (str): Directory where the MP3 will be saved.
+        manifest (PartManifest): Optional ledger to record the finished part in.
+
+    Returns:
+        float: Duration of the MP3 in seconds, or 0 if the capture isn't usable.
+    """
+    fn = f"part{part_num:02d}.mp3"
+    try:
+        # Validates the audio before it replaces anything.
+        duration = convert_metadata.get_mp3_duration(captured_path)
+    except Exception as e:
+        print(f"Captured audio for part {part_num} is not usable: {e}")
+        return 0
+
+    print(f"Using captured audio for part {part_num}")
+    os.replace(captured_path, os.path.join(download_path, fn))
+    if manifest:
+        manifest.record(fn, duration)
+    return duration
+
+
+def probe_mp3_part(url, cookies: list) -> bool:
+    """
+    Checks that an MP3 part URL exists, fetching at most one byte of it.
+
+    Args:
+        url (str): The URL of the MP3 part.
+        cookies (list): List of cookies (dicts) for authentication.
+
+    Returns:
+        bool: True if the server serves audio at the URL.
+    """
+    try:
+        # A wrong guess shouldn't hold up the search with retries.
+        response = download_client.client.get(url, cookies, {'Range': 'bytes=0-0'}, stream=True, retry=False)
+    except requests.RequestException as e:
+        print(f"Failed to probe mp3 part: {e}")
+        return False
+
+    with response:
+        # Error pages sometimes come back as 200 with an HTML body.
+        content_type = response.headers.get('Content-Type', '')
+        return response.status_code in (200, 206) and not content_type.startswith('text/')
+
+
+class PartDownloader:
+    """Downloads MP3 parts on a bounded pool of background threads."""
+    def __init__(self, download_path: str, workers: int = 2, manifest=None, segments: int = 1):
+        """
+        Args:
+            download_path (str): Directory where the MP3 parts will be saved.
+            workers (int): Maximum number of parts downloading at once.
+            manifest (PartManifest): Optional ledger to record finished parts in.
+            segments (int): Byte ranges to split each large part into, 1 to download parts in one stream.
+        """
+        self.download_path = download_path
+        self.manifest = manifest
+        self.segments = segments
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="part-download")
+        self.pending = {} # part_num -> Future
+        self.durations = {} # part_num -> duration, known before the download finishes
+        self.durations_changed = threading.Condition()
+        self.reused = 0 # parts taken from the browser's captures, counted by the download threads
+        self.reused_lock = threading.Lock()
+
+    def _set_duration(self, part_num: int, duration: float):
+        with self.durations_changed:
+            self.durations[part_num] = duration
+            self.durations_changed.notify_all()
+
+    def _fetch(self, url, part_num: int, cookies: list, captured_path: str | None) -> float:
+        try:
+            if captured_path:
+                if duration := use_captured_part(captured_path, part_num, self.download_path, self.manifest):
+                    with self.reused_lock:
+                        self.reused += 1
+                    self._set_duration(part_num, duration)
+                    return duration
+            if self.segments > 1:
+                duration = download_mp3_part_segmented(url, part_num, self.download_path, cookies, self.segments, manifest=self.manifest)
+            else:
+                duration = download_mp3_part(url, part_num, self.download_path, cookies, self.manifest,
+                                             lambda early: self._set_duration(part_num, early))
+            if duration:
+                self._set_duration(part_num, duration)
+            return duration
+        finally:
+            # A failed part has no duration, wake wait_for_durations() to notice it is done.
+            with self.durations_changed:
+                self.durations_changed.notify_all()
+
+    def submit(self, url, part_num: int, cookies: list, captured_path: str | None = None):
+        """
+        Queues a part for download.
+
+        Args:
+            url (str): The URL of the MP3 part.
+            part_num (int): The part number, used to name the file.
+            cookies (list): Snapshot of the session cookies to authenticate with.
+            captured_path (str): Complete copy of the part captured by the browser proxy, used if valid.
+        """
+        with self.durations_changed:
+            self.durations.pop(part_num, None)
+        self.pending[part_num] = self.executor.submit(self._fetch, url, part_num, list(cookies), captured_path)
+
+    def wait(self):
+        """Blocks until every queued part has finished or failed."""
+        concurrent.futures.wait(self.pending.values())
+
+    def wait_for_durations(self) -> float | None:
+        """
+        Blocks until the duration of every queued part is known, which for
+        single-stream downloads is as soon as their first MiB has arrived.
+
+        Returns:
+            float or None: Total duration of the queued parts, or None if one of
+                them has finished meanwhile and should be collected with completed() first.
+        """
+        with self.durations_changed:
+            while True:
+                if any(future.done() for future in self.pending.values()):
+                    return None
+                if all(part_num in self.durations for part_num in self.pending):
+                    return sum(self.durations[part_num] for part_num in self.pending)
+                self.durations_changed.wait(1)
+
+    def completed(self) -> list[tuple[int, float]]:
+        """
+        Collects the parts that finished since the last call.
+
+        Returns:
+            list: (part_num, duration) pairs in part order, duration is 0 on failure.
+        """
+        done = []
+        for part_num, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[part_num]
+            try:
+                length = future.result()
+            except Exception as e:
+                print(f"Error downloading part {part_num}: {e}")
+                length = 0
+            done.append((part_num, length))
+        return sorted(done)
+
+    def shutdown(self, cancel=False):
+        """Stops the pool, waiting for running downloads; queued ones are dropped if cancel is set."""
+        self.executor.shutdown(wait=True, cancel_futures=cancel)
+
 
 def download_cover(cover_url: str, download_path: str, cookies: list, abort=False):
     """
@@ -50,24 +440,30 @@ def download_cover(cover_url: str, download_path: str, cookies: list, abort=Fals
     Returns:
         bool: True if download succeeded, False otherwise.
     """
-
-    cookie_dict = {cookie['name']: cookie['value'] for cookie in cookies}
-    response = requests.get(cover_url, headers=headers, cookies=cookie_dict, stream=True)
-    
-    if response.status_code == 200:
-        with open(download_path, 'wb') as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
-        return True
-    else:
-        print(f"Failed to download cover with status code {response.status_code}")
+    client = download_client.client
+    try:
+        response = client.get(cover_url, cookies, stream=True)
+    except requests.RequestException as e:
+        print(f"Failed to download cover: {e}")
         if abort:
-            response.raise_for_status()
+            raise
         return False
 
+    with response:
+        if response.status_code == 200:
+            with open(download_path, 'wb') as f:
+                for chunk in client.iter_body(response):
+                    f.write(chunk)
+            return True
+        else:
+            print(f"Failed to download cover with status code {response.status_code}")
+            if abort:
+                response.raise_for_status()
+            return False
+
 def download_thunder_metadata(book_id: int, download_path: str) -> bool:
     """
-    Downloads metadata for a book using the Thunder API and saves it to a file.
+    Fetches metadata for a book from the Thunder API (or its cache) and saves it to a file.
     
     Args:
         book_id (int): Unique book ID used by Thunder API.
@@ -76,14 +472,11 @@ def download_thunder_metadata(book_id: int, download_path: str) -> bool:
     Returns:
         bool: True if download and write succeeded, False otherwise.
     """
-    api_url = f"https://thunder.api.overdrive.com/v2/media/{book_id}"
-    response = requests.get(api_url)
-
-    if response.status_code == 200:
-        book_metadata = response.json()
-        with open(download_path, 'w') as f:
-            json.dump(book_metadata, f, ensure_ascii=False, indent=4)
-        return True
-    else:
-        print(f"Failed to download metadata with status code {response.status_code}")
+    # Served from the on-disk cache when fresh, or from a prefetch already under way.
+    book_metadata = thunder_cache.cache.get(book_id)
+    if book_metadata is None:
         return False
+
+    with open(download_path, 'w') as f:
+        json.dump(book_metadata, f, ensure_ascii=False, indent=4)
+    return True
@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import threading
+from atomicwrites import atomic_write
+import convert_metadata
+
+# Ledger of downloaded parts, kept in the book's tmp dir.
+MANIFEST_FILE = "manifest.json"
+
+def file_checksum(filepath: str) -> str:
+    """Returns the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(1024*1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PartManifest:
+    """
+    Records the size, mtime, duration and checksum of each MP3 part as it is
+    written, so totals and resume checks don't have to re-parse every file.
+    """
+    def __init__(self, directory: str):
+        """
+        Loads the manifest from the given directory, starting empty if there is none.
+
+        Args:
+            directory (str): The book's tmp dir holding the part files.
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.lock = threading.Lock()
+        self.parts = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    self.parts = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                # Every part will just be re-parsed.
+                print(f"Ignoring unreadable part manifest: {e}")
+
+    def _save(self):
+        with atomic_write(self.path, overwrite=True) as f:
+            json.dump(self.parts, f, indent=4)
+
+    def record(self, filename: str, duration: float, checksum: str | None = None):
+        """
+        Adds or replaces a part's entry, called right after the part is written.
+
+        Args:
+            filename (str): Part file name within the directory.
+            duration (float): Duration of the part in seconds.
+            checksum (str): SHA-256 of the file, computed here if not given.
+        """
+        filepath = os.path.join(self.directory, filename)
+        stat = os.stat(filepath)
+        entry = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "duration": duration,
+            "checksum": checksum or file_checksum(filepath),
+        }
+        with self.lock:
+            self.parts[filename] = entry
+            self._save()
+
+    def duration(self, filename: str) -> float:
+        """
+        Returns a part's duration, only parsing the file if it is new or changed.
+
+        Args:
+            filename (str): Part file name within the directory.
+
+        Returns:
+            float: Duration of the part in seconds.
+        """
+        filepath = os.path.join(self.directory, filename)
+        stat = os.stat(filepath)
+        with self.lock:
+            entry = self.parts.get(filename)
+        if entry and entry["size"] == stat.st_size:
+            if entry["mtime"] == stat.st_mtime:
+                return entry["duration"]
+            # Touched but possibly unchanged (e.g. copied around), the checksum decides.
+            checksum = file_checksum(filepath)
+            if checksum == entry["checksum"]:
+                self.record(filename, entry["duration"], checksum)
+                return entry["duration"]
+
+        duration = convert_metadata.get_mp3_duration(filepath)
+        self.record(filename, duration)
+        return duration
+
+    def total_duration(self) -> int:
+        """Calculates the total duration of all MP3 files in the directory."""
+        total_duration = 0.0
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".mp3"):
+                total_duration += self.duration(filename)
+        return int(total_duration)
@@ -0,0 +1,76 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class StagePipeline:
+    """
+    Passes jobs through a chain of stages, each running on its own
+    single-thread executor and handing jobs on through a bounded queue.
+
+    A stage is a function taking the job dict and returning it (possibly
+    updated) to pass it on, or None if the job failed. While one job is in a later
+    stage the earlier stages already work on the next one; the bounded
+    queues stop a fast stage from running far ahead of a slow one.
+    """
+    def __init__(self, stages: list[tuple[str, callable]], queue_size: int = 1):
+        """
+        Args:
+            stages (list): (name, function) pairs, in order.
+            queue_size (int): Jobs that may wait in front of each stage.
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.stage_times = {name: 0.0 for name, _ in stages}
+        self.failed = []
+        self.lock = threading.Lock()
+        self.executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stage-{name}") for name, _ in stages]
+        self.futures = [executor.submit(self._run_stage, i) for i, executor in enumerate(self.executors)]
+        self.start = time.monotonic()
+
+    def _run_stage(self, index: int):
+        name, func = self.stages[index]
+        next_queue = self.queues[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            job = self.queues[index].get()
+            if job is None:
+                # End of input, let the next stage finish too.
+                if next_queue:
+                    next_queue.put(None)
+                return
+
+            start = time.monotonic()
+            try:
+                result = func(job)
+            except (Exception, SystemExit) as e:
+                # The scraper exits on errors, which mustn't stop the other books.
+                print(f"{name} stage failed for {job.get('title', job)}: {e!r}")
+                result = None
+            if result is None:
+                with self.lock:
+                    self.failed.append(job)
+            job = result
+            with self.lock:
+                self.stage_times[name] += time.monotonic() - start
+
+            if job is not None and next_queue:
+                next_queue.put(job)
+
+    def put(self, job: dict):
+        """Queues a job for the first stage, blocking while that stage's queue is full."""
+        self.queues[0].put(job)
+
+    def close(self):
+        """Waits for every queued job to pass through all stages, then stops the executors."""
+        self.queues[0].put(None)
+        for future in self.futures:
+            future.result()
+        for executor in self.executors:
+            executor.shutdown()
+
+    def report(self):
+        """Prints the wall time spent in each stage against the total."""
+        total = time.monotonic() - self.start
+        print(f"Pipeline finished in {total:.1f}s")
+        for name, seconds in self.stage_times.items():
+            print(f"  {name:<10} {seconds:8.1f}s")
@@ -8,13 +8,79 @@ from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import ElementClickInterceptedException
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.common.action_chains import ActionChains
+from driver_resolver import resolve_chromedriver
 import overdrive_download
+from part_manifest import PartManifest
 from convert_metadata import to_hms
 import convert_metadata
 import os
+import json
 import time
 import sys
+import re
+import threading
+import concurrent.futures
+import resource
+from atomicwrites import atomic_write
+
+# Per-book cache of the chapter:part structure, kept in the book's tmp dir.
+STRUCTURE_FILE = "structure.json"
+
+# Requests the browser never needs: web fonts and analytics/ad hosts. Patterns
+# use Chrome's '*' wildcard; the player's manifest and audio are untouched.
+DEFAULT_BLOCKED_URLS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*facebook.net*", "*hotjar.com*",
+    "*newrelic.com*", "*nr-data.net*", "*scorecardresearch.com*",
+    "*quantserve.com*", "*optimizely.com*", "*segment.io*",
+]
+
+# Scrapes run as one execute_script each instead of a WebDriver call per
+# element. visibleText() mirrors WebElement.text, which is '' when hidden.
+VISIBLE_TEXT_JS = """
+const visibleText = el => el && el.getClientRects().length ? el.innerText.trim() : '';
+"""
+
+LOANS_JS = VISIBLE_TEXT_JS + """
+return Array.from(document.getElementsByClassName('Loans-TitleContainerRight'), block => {
+    const link = Array.from(block.getElementsByTagName('a')).find(a => visibleText(a).includes('Listen now'));
+    return {
+        title: visibleText(block.querySelector('.title-name')),
+        author: visibleText(block.querySelector('.title-author')),
+        link: link ? link.href : null,
+    };
+});
+"""
+
+CHAPTERS_JS = VISIBLE_TEXT_JS + """
+const table = document.querySelector('.chapter-dialog-table');
+if (!table) return null;
+return {
+    titles: Array.from(table.getElementsByClassName('chapter-dialog-row-title'), visibleText),
+    times: Array.from(table.getElementsByClassName('place-phrase-visual'), visibleText),
+};
+"""
+
+def part_starts_from_lengths(part_lengths: dict) -> dict:
+    """
+    Computes where each part starts from the durations of the parts before it.
+
+    Args:
+        part_lengths (dict): Part number to duration in seconds.
+
+    Returns:
+        dict: Part number to start in seconds, for every part whose predecessors are all known.
+    """
+    starts = {}
+    position = 0.0
+    part_num = 1
+    while part_num in part_lengths:
+        starts[part_num] = int(position)
+        position += part_lengths[part_num]
+        part_num += 1
+    return starts
 
 class Scraper:
     """Automated Overdrive audiobook downloader using Selenium."""
@@ -29,6 +95,21 @@ class Scraper:
         self.config = config
         self.chapter_seconds = []
 
+        # Part ID -> URL index, filled by the response interceptor as the
+        # player fetches parts, so lookups never rescan driver.requests.
+        self.mp3_urls = {}
+        self.mp3_urls_lock = threading.Lock()
+
+        # Notified whenever a new part ID is indexed, wakes wait_for_player().
+        self.mp3_event = threading.Condition(self.mp3_urls_lock)
+        self.wait_timeout = config.get("wait-timeout", 0.5)
+        self.wait_settle = config.get("wait-settle", 0.2)
+        self.wait_stats = {"early": 0, "timeout": 0}
+
+        # Seeking by clicking the timeline, disabled for the book if the player ignores it.
+        self.direct_seek = config.get("direct-seek", True)
+        self.seek_count = 0
+
         # Fix URL construction - use the full library URL provided in config
         self.base_url = config["library"]
         if not self.base_url.startswith("https://"):
@@ -47,12 +128,44 @@ class Scraper:
         self.chrome_options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         self.chrome_options.add_argument("--mute-audio")
 
+        # Only capture what the scraper reads (part URLs and the cover).
+        # selenium-wire still buffers the whole body of every captured part,
+        # so the store stays on disk, where get_book clears it as it goes.
+        self.capture_scopes = config.get("capture-scopes", [r'\.mp3', r'\.jpg'])
+        self.seleniumwire_options = {}
+        self.cover_url = None
+        self.request_store_clears = 0
+
+        # Blocked in the browser itself, out-of-scope requests never reach our interceptors.
+        self.blocked_urls = []
+        if config.get("block-resources"):
+            self.blocked_urls = config.get("blocked-urls") or DEFAULT_BLOCKED_URLS
+
+        # Part ID -> Future of the file holding a complete part captured by
+        # the proxy, only filled when 'capture-dir' is set for the current
+        # book. The files are written off the proxy thread.
+        self.capture_dir = None
+        self.captured_parts = {}
+        self.capture_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+
         self.driver = None
 
     def __del__(self):
         if self.driver:
             self.driver.quit()
 
+    def load_page(self, url: str, label: str):
+        """
+        Navigates to a page and logs how long it took to load.
+
+        Args:
+            url (str): Page to load.
+            label (str): Short name of the page for the log.
+        """
+        start = time.monotonic()
+        self.driver.get(url)
+        print(f"Loaded {label} page in {time.monotonic() - start:.2f}s")
+
     def get_cookies(self):
         """Returns the current browser session cookies."""
         return self.driver.get_cookies().copy()
@@ -63,7 +176,7 @@ class Scraper:
         if not self.driver:
             raise Exception("Driver not initialized")
 
-        self.driver.get(self.base_url + "/account/ozone/sign-in")
+        self.load_page(self.base_url + "/account/ozone/sign-in", "sign-in")
 
         # Dismiss cookie banner if present
         banners = self.driver.find_elements(By.CLASS_NAME, 'cookie-banner-close-button')
@@ -100,9 +213,17 @@ class Scraper:
             list[dict]: Valid session cookies.
         """
         if not self.driver:
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=self.chrome_options)
-            self.driver.get(self.base_url)
+            start = time.monotonic()
+            driver_path = resolve_chromedriver(self.config.get("chromedriver-path"), self.config.get("chromedriver-cache"))
+            service = Service(driver_path)
+            self.driver = webdriver.Chrome(service=service, options=self.chrome_options, seleniumwire_options=self.seleniumwire_options)
+            self.driver.scopes = self.capture_scopes
+            self.driver.response_interceptor = self._index_response
+            if self.blocked_urls:
+                self.driver.execute_cdp_cmd('Network.enable', {})
+                self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+            print(f"Browser started in {time.monotonic() - start:.1f}s using {driver_path}")
+            self.load_page(self.base_url, "home")
             try:
                 for cookie in cookies:
                     self.driver.add_cookie(cookie)
@@ -111,7 +232,7 @@ class Scraper:
                 return self._login()
 
         # Go to authenticated page to test if cookies are still valid
-        self.driver.get(self.base_url + "/account/loans")
+        self.load_page(self.base_url + "/account/loans", "loans")
 
         loans_titles = self.driver.find_elements(By.CLASS_NAME, 'account-title')
         if loans_titles:
@@ -132,7 +253,7 @@ class Scraper:
         if not self.driver:
             raise Exception("Driver not initialized")
 
-        self.driver.get(self.base_url + "/account/loans")
+        self.load_page(self.base_url + "/account/loans", "loans")
 
         try:
             WebDriverWait(self.driver, 15).until(
@@ -143,46 +264,327 @@ class Scraper:
             sys.exit(4)
 
         books = []
-        loan_blocks = self.driver.find_elements(By.CLASS_NAME, 'Loans-TitleContainerRight')
+        loan_blocks = self.driver.execute_script(LOANS_JS)
 
         for index,block in enumerate(loan_blocks):
-            title_element = block.find_element(By.CLASS_NAME, 'title-name')
-            author_element = block.find_element(By.CLASS_NAME, 'title-author')
-            listen_links = block.find_elements(By.PARTIAL_LINK_TEXT, 'Listen now')
             listen_link = book_id = None
             # Parse cautiously, other media types can be checked out but we don't get them.
-            if listen_links:
-                if listen_link := listen_links[0].get_attribute('href'):
-                    book_id = listen_link.split('/')[-1]
+            if listen_link := block["link"]:
+                book_id = listen_link.split('/')[-1]
             if not book_id:
-                print(f"Book at index {index} has no listen link, may not be audiobook: {title_element.text.strip()}")
+                print(f"Book at index {index} has no listen link, may not be audiobook: {block['title']}")
                 continue
 
-            books.append({"index": index, "title": title_element.text.strip(), "author": author_element.text.strip(), "link": listen_link, "id": book_id})
+            books.append({"index": index, "title": block["title"], "author": block["author"], "link": listen_link, "id": book_id})
 
         return books
     
     def has_url(self, part_num) -> bool:
-        mp3_urls = self.requests_to_mp3_files()
-        url = mp3_urls.get(f"{part_num:02d}")
-        return url is not None
+        with self.mp3_urls_lock:
+            return f"{part_num:02d}" in self.mp3_urls
+
+    def _index_response(self, request, response):
+        """
+        selenium-wire response interceptor, records MP3 part URLs and the cover URL as they arrive.
+
+        Runs on the proxy thread for every captured response, so it must stay cheap.
+        """
+        if '.jpg' in request.url and 'listen.overdrive.com' in request.url:
+            if self.cover_url is None:
+                self.cover_url = request.url
+            return
+        if '.mp3' not in request.url or "Part" not in request.url:
+            return
+        part_id = request.url.split("Part")[1].split(".mp3")[0]
+        if self.capture_dir:
+            self._save_capture(part_id, response)
+        with self.mp3_event:
+            if part_id not in self.mp3_urls:
+                self.mp3_urls[part_id] = request.url
+                self.mp3_event.notify_all()
+
+    def _save_capture(self, part_id: str, response):
+        """
+        Keeps a part's response body if it holds the whole file, so it needn't be downloaded again.
+
+        Only checks the headers, the file is written by the capture executor.
+
+        Args:
+            part_id (str): Part ID from the URL.
+            response: The selenium-wire response.
+        """
+        body = response.body
+        if not body or response.headers.get('Content-Encoding', 'identity') != 'identity':
+            return
+        if response.status_code == 200:
+            complete = int(response.headers.get('Content-Length', len(body))) == len(body)
+        elif response.status_code == 206:
+            # Only a range covering the whole file counts, e.g. 'bytes 0-999/1000'.
+            match = re.fullmatch(r'bytes 0-(\d+)/(\d+)', response.headers.get('Content-Range', ''))
+            complete = bool(match) and int(match[1]) + 1 == int(match[2]) == len(body)
+        else:
+            complete = False
+        if not complete:
+            return
+
+        with self.mp3_urls_lock:
+            if self.capture_dir and part_id not in self.captured_parts:
+                captured_path = os.path.join(self.capture_dir, f"part{part_id}.mp3")
+                self.captured_parts[part_id] = self.capture_executor.submit(self._write_capture, captured_path, body)
+
+    def _write_capture(self, captured_path: str, body: bytes) -> str | None:
+        """Writes a captured part to disk, returning its path, or None if it couldn't be written."""
+        try:
+            with atomic_write(captured_path, mode="wb", overwrite=True) as f:
+                f.write(body)
+        except OSError as e:
+            print(f"Warning: could not keep captured part: {e}")
+            return None
+        return captured_path
+
+    def predict_part_url(self, part_num) -> str | None:
+        """
+        Derives a candidate URL for a part from the part URLs already captured.
+
+        Part URLs only differ in their 'PartNN.mp3' segment, so the closest
+        known part is used as the template.
+
+        Args:
+            part_num (int): The part number to predict.
+
+        Returns:
+            str or None: Candidate URL, or None if no part is known yet.
+        """
+        with self.mp3_urls_lock:
+            known = dict(self.mp3_urls)
+        if not known:
+            return None
+        part_id, url = min(known.items(), key=lambda item: abs(int(item[0]) - part_num))
+        return url.replace(f"Part{part_id}.mp3", f"Part{part_num:0{len(part_id)}d}.mp3", 1)
+
+    def probe_part_url(self, part_num) -> bool:
+        """
+        Tries to find a part by probing its predicted URL instead of seeking the player.
+
+        Args:
+            part_num (int): The part number to look for.
+
+        Returns:
+            bool: True if the part was validated and added to the index.
+        """
+        url = self.predict_part_url(part_num)
+        if not url or not overdrive_download.probe_mp3_part(url, self.get_cookies()):
+            return False
+        with self.mp3_urls_lock:
+            self.mp3_urls.setdefault(f"{part_num:02d}", url)
+        print(f"Found part {part_num} by probing its predicted url")
+        return True
+
+    def reset_mp3_index(self):
+        """Forgets all known part URLs and the cover, called before loading a new book."""
+        with self.mp3_urls_lock:
+            self.mp3_urls.clear()
+            self.capture_dir = None
+            self.captured_parts = {}
+        self.cover_url = None
+        self.clear_request_store()
+
+    def clear_request_store(self):
+        """Drops selenium-wire's captured requests, the URL index already holds what we use."""
+        del self.driver.requests
+        self.request_store_clears += 1
 
     def requests_to_mp3_files(self) -> dict:
         """
-        Extracts MP3 file URLs from the browser's request history.
+        Returns the MP3 file URLs seen in the browser's requests so far.
 
         Returns:
             dict: Part ID to URL mapping.
         """
-        urls = {}
+        with self.mp3_urls_lock:
+            return dict(self.mp3_urls)
+
+    def player_mark(self, timeline_element) -> Tuple[str, frozenset]:
+        """
+        Snapshots the player state before an action, for wait_for_player().
+
+        Args:
+            timeline_element: The 'timeline-start-minutes' text element.
+
+        Returns:
+            tuple: (timeline text, IDs of the parts seen so far)
+        """
+        with self.mp3_event:
+            part_ids = frozenset(self.mp3_urls)
+        return timeline_element.get_attribute("textContent"), part_ids
+
+    def wait_for_player(self, timeline_element, mark: Tuple[str, frozenset], timeout=None) -> bool:
+        """
+        Waits for the player to react to an action, instead of a fixed sleep.
+
+        Wakes as soon as a part that wasn't seen at the mark is captured;
+        the player fetching more of a known part doesn't count. Otherwise a
+        change of the timeline text ends the wait, after a short settle period
+        that gives the matching MP3 request a chance to arrive.
+
+        Args:
+            timeline_element: The 'timeline-start-minutes' text element.
+            mark (tuple): Result of player_mark() taken before the action.
+            timeout (float): Upper limit in seconds, defaults to 'wait-timeout'.
+
+        Returns:
+            bool: True if the wait ended early, False if it timed out.
+        """
+        start_text, start_parts = mark
+        now = time.monotonic()
+        deadline = now + (self.wait_timeout if timeout is None else timeout)
+        settled = False
+        while now < deadline:
+            with self.mp3_event:
+                # Poll the timeline text every 50ms, a new part wakes us immediately.
+                self.mp3_event.wait(min(0.05, deadline - now))
+                if self.mp3_urls.keys() - start_parts:
+                    self.wait_stats["early"] += 1
+                    return True
+            if not settled and timeline_element.get_attribute("textContent") != start_text:
+                settled = True
+                deadline = min(deadline, time.monotonic() + self.wait_settle)
+            now = time.monotonic()
+        if settled:
+            self.wait_stats["early"] += 1
+            return True
+        self.wait_stats["timeout"] += 1
+        return False
+
+    def seek_to(self, seconds: int, timeline_current_time, total_seconds: int) -> int | None:
+        """
+        Moves the playhead straight to a timestamp with one click on the timeline bar.
+
+        Args:
+            seconds (int): Location in the book to seek to.
+            timeline_current_time: The 'timeline-start-minutes' text element.
+            total_seconds (int): Length of the whole book.
+
+        Returns:
+            int or None: Location the player landed on, or None if direct seeking is unavailable.
+        """
+        if not self.direct_seek:
+            return None
+        bars = self.driver.find_elements(By.CSS_SELECTOR, self.config.get("seek-selector", ".timeline-bar"))
+        width = bars[0].size["width"] if bars else 0
+        if not width:
+            print("Timeline bar not found, direct seeking disabled")
+            self.direct_seek = False
+            return None
+
+        # Selenium offsets are measured from the element's centre.
+        fraction = min(max(seconds / total_seconds, 0.0), 1.0)
+        offset = int((fraction - 0.5) * (width - 1))
+        mark = self.player_mark(timeline_current_time)
+        ActionChains(self.driver).move_to_element_with_offset(bars[0], offset, 0).click().perform()
+        self.wait_for_player(timeline_current_time, mark, 1)
+        self.seek_count += 1
+
+        landed = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+        # One pixel of the bar covers total_seconds/width, allow a few of them.
+        if abs(landed - seconds) > max(30, 3 * total_seconds / width):
+            print(f"Direct seek to {to_hms(seconds)} landed at {to_hms(landed)}, falling back to stepping")
+            self.direct_seek = False
+            return None
+        return landed
+
+    def bisect_part(self, part_num, lower_bound: int, upper_bound: int, timeline_current_time, total_seconds: int) -> Tuple[int, int]:
+        """
+        Narrows the range holding the start of a missing part by bisecting with direct seeks.
+
+        Args:
+            part_num (int): The missing part.
+            lower_bound (int): Start of the part, the end of the parts before it.
+            upper_bound (int): Latest location the part can start at.
+            timeline_current_time: The 'timeline-start-minutes' text element.
+            total_seconds (int): Length of the whole book.
+
+        Returns:
+            tuple: The narrowed (lower_bound, upper_bound), for the stepping search to finish if needed.
+        """
+        while not self.has_url(part_num) and upper_bound - lower_bound > 15:
+            landed = self.seek_to((lower_bound + upper_bound) // 2, timeline_current_time, total_seconds)
+            if landed is None or self.has_url(part_num):
+                break
+            if not lower_bound <= landed <= upper_bound:
+                # Below the bar's resolution, leave the rest to the stepping search.
+                break
+            if landed <= lower_bound + 15:
+                # Part lengths are a few seconds fuzzy, so this is still before the part.
+                lower_bound = landed + 1
+            else:
+                print(f"No URL for {part_num} at {landed}, reducing to {landed-1}.")
+                upper_bound = landed - 1
+        return lower_bound, upper_bound
+
+    def save_structure(self, download_path: str, structure: dict):
+        """
+        Writes the book's structure cache into its tmp dir.
+
+        Args:
+            download_path (str): The book's tmp dir.
+            structure (dict): Chapters, chapter:part maps, part boundaries and urls.
+        """
+        with atomic_write(os.path.join(download_path, STRUCTURE_FILE), overwrite=True) as f:
+            json.dump(structure, f, indent=4)
+
+    def load_structure(self, download_path: str, book_id: str, expected_time: str, timeline_current_time, chapter_title_button) -> dict | None:
+        """
+        Loads the structure cache left by an earlier run, if it still matches the player.
+
+        Args:
+            download_path (str): The book's tmp dir.
+            book_id (str): ID of the book being downloaded.
+            expected_time (str): Book length shown by the player.
+            timeline_current_time: The 'timeline-start-minutes' text element.
+            chapter_title_button: The chapter bar button showing the current chapter title.
 
-        for request in self.driver.requests:
-            if request.response:
-                if '.mp3' in request.url:
-                    part_id = request.url.split("Part")[1].split(".mp3")[0]
-                    if part_id not in urls:
-                        urls[part_id] = request.url
-        return urls
+        Returns:
+            dict or None: The cached structure, or None if it's missing or stale.
+        """
+        structure_path = os.path.join(download_path, STRUCTURE_FILE)
+        if not os.path.isfile(structure_path):
+            return None
+        try:
+            with open(structure_path) as f:
+                structure = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable structure cache: {e}")
+            return None
+
+        if structure.get("id") != book_id or structure.get("expected_time") != expected_time:
+            print("Structure cache doesn't match this book, rebuilding it")
+            return None
+
+        # The chapter bar names the chapter the player is in, which must agree
+        # with the cached chapter times.
+        self.chapter_seconds = structure["chapter_seconds"]
+        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+        cached_title = structure["chapter_titles"][min(self.chapter_containing(current_location), len(structure["chapter_titles"]) - 1)]
+        shown_title = chapter_title_button.text.strip()
+        if shown_title and cached_title not in shown_title:
+            print(f"Structure cache expected chapter '{cached_title}' but player shows '{shown_title}', rebuilding it")
+            self.chapter_seconds = []
+            return None
+
+        # JSON turns the integer keys into strings.
+        for key in ("chapter_to_part", "part_to_chapter", "part_starts"):
+            structure[key] = {int(k): v for k, v in structure[key].items()}
+
+        # Urls of parts still to download may have expired, keep the ones that answer.
+        cookies = self.get_cookies()
+        for part_id, url in structure.get("part_urls", {}).items():
+            if os.path.isfile(os.path.join(download_path, f"part{int(part_id):02d}.mp3")):
+                continue
+            if overdrive_download.probe_mp3_part(url, cookies):
+                with self.mp3_urls_lock:
+                    self.mp3_urls.setdefault(part_id, url)
+        return structure
 
     def chapter_containing(self, current_location) -> int:
         # Don't enumerate the last element, it's actually the end of the book.
@@ -245,13 +647,14 @@ class Scraper:
         desired_chapter = earliest_chapter if earliest_distance <= ending_distance else ending_chapter
         return (desired_chapter, self.chapter_seconds[desired_chapter]), current_chapter
 
-    def get_book(self, selected_title_link: str, download_path: str):
+    def get_book(self, selected_title_link: str, download_path: str, on_part: callable = None):
         """
         Downloads the selected audiobook and associated metadata.
 
         Args:
             selected_title_link (str): The "Listen Now" URL of the book.
             download_path (str): Folder path to save the book to.
+            on_part (callable): Called with the path of each MP3 part once it is complete on disk.
 
         Returns:
             tuple: (chapter_markers, total_expected_time)
@@ -259,9 +662,23 @@ class Scraper:
         if not self.driver:
             raise Exception("Driver is not initialized")
 
-        # Go to book listen page
-        self.driver.get(selected_title_link)
-        time.sleep(1)
+        # Go to book listen page, parts from any previous book don't apply.
+        self.reset_mp3_index()
+        self.chapter_seconds = []
+        self.wait_stats = {"early": 0, "timeout": 0}
+        self.request_store_clears = 0
+        self.direct_seek = self.config.get("direct-seek", True)
+        if self.config.get("reuse-captured"):
+            # A subdirectory, so captures never count as downloaded parts.
+            self.capture_dir = os.path.join(download_path, "captured")
+            os.makedirs(self.capture_dir, exist_ok=True)
+        start = time.monotonic()
+        self.load_page(selected_title_link, "listen")
+        # The player is usable once it shows the book length.
+        WebDriverWait(self.driver, 15).until(
+            lambda d: d.find_element(By.CLASS_NAME, 'timeline-end-minutes').get_attribute("textContent").strip()
+        )
+        print(f"Player rendered in {time.monotonic() - start:.2f}s")
 
         # Fetch player elements
         chapter_previous = self.driver.find_element(By.CLASS_NAME, 'chapter-bar-prev-button')
@@ -279,123 +696,153 @@ class Scraper:
         if None in fetched:
             raise Exception(f"Failed to fetch one or more player elements: {fetched}")
 
-        # Get chapter metadata
-        print("Getting chapters")
+        expected_time = timeline_length.get_attribute("textContent").replace("-", "")
+        print(f"Final book should be ~{expected_time} in length.")
+        expected_duration = convert_metadata.to_seconds(expected_time)
 
-        chapter_table_open.click()
-        time.sleep(1)
+        # A retry of the same book reuses the structure mapped last time.
+        book_id = selected_title_link.split('/')[-1]
+        structure = self.load_structure(download_path, book_id, expected_time, timeline_current_time, chapter_table_open)
+        if structure:
+            print("Using cached chapter:part structure")
+            chapter_markers = structure["chapter_markers"]
+            chapter_titles = structure["chapter_titles"]
+            chapter_to_part = structure["chapter_to_part"]
+            part_to_chapter = structure["part_to_chapter"]
+            part_starts = structure["part_starts"]
+        else:
+            # Get chapter metadata
+            print("Getting chapters")
 
-        chapter_markers = {}
+            chapter_table_open.click()
+            time.sleep(1)
 
-        chapter_dialog_table = self.driver.find_element(By.CLASS_NAME, 'chapter-dialog-table')
-        if not chapter_dialog_table:
-            raise Exception("Failed to find chapter dialog table")
+            chapter_markers = {}
 
-        chapter_title_elements = chapter_dialog_table.find_elements(By.CLASS_NAME, 'chapter-dialog-row-title')
-        chapter_time_elements = chapter_dialog_table.find_elements(By.CLASS_NAME, 'place-phrase-visual')
+            chapter_dialog = self.driver.execute_script(CHAPTERS_JS)
+            if not chapter_dialog:
+                raise Exception("Failed to find chapter dialog table")
 
-        if not chapter_title_elements:
-            raise Exception("Failed to find chapter title elements")
-        if not chapter_time_elements:
-            raise Exception("Failed to find chapter time elements")
+            chapter_titles = chapter_dialog["titles"]
+            if not chapter_titles:
+                raise Exception("Failed to find chapter title elements")
+            if not chapter_dialog["times"]:
+                raise Exception("Failed to find chapter time elements")
 
-        chapter_times = []
+            chapter_times = []
   
-        mp3_urls = self.requests_to_mp3_files()
-        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+            mp3_urls = self.requests_to_mp3_files()
+            current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
 
-        for elem in chapter_time_elements:
-            if elem.text:
-                chapter_times.append(elem.text)
-                self.chapter_seconds.append(convert_metadata.to_seconds(elem.text))
+            for text in chapter_dialog["times"]:
+                if text:
+                    chapter_times.append(text)
+                    self.chapter_seconds.append(convert_metadata.to_seconds(text))
 
-        for index, title in enumerate(chapter_title_elements):
-            if index == 0:
-                title.click()
-            chapter_markers[title.text] = chapter_times[index]
+            for index, title in enumerate(chapter_titles):
+                chapter_markers[title] = chapter_times[index]
+
+            # Start the skim from the first chapter.
+            self.driver.find_element(By.CLASS_NAME, 'chapter-dialog-row-title').click()
         
-        # Close chapter table
-        chapter_table_close = self.driver.find_element(By.CLASS_NAME, 'shibui-shield')
-        chapter_table_close.click()
-        time.sleep(1)
+            # Close chapter table
+            chapter_table_close = self.driver.find_element(By.CLASS_NAME, 'shibui-shield')
+            chapter_table_close.click()
+            time.sleep(1)
 
-        print(f"Got {len(chapter_times)} chapters")
+            print(f"Got {len(chapter_times)} chapters")
 
-        expected_time = timeline_length.get_attribute("textContent").replace("-", "")
-        print(f"Final book should be ~{expected_time} in length.")
+            self.chapter_seconds.append(expected_duration)
 
-        expected_duration = convert_metadata.to_seconds(expected_time)
-        self.chapter_seconds.append(expected_duration)
-
-        print("Getting chapter:part structure.")
-
-        # Initialize part 1 always in chapter 0.
-        chapter_to_part = {0:1}
-        seen_parts = {1}
-
-        # Add the chapter the ereader started up in.
-        ch = self.chapter_containing(current_location)
-        parts = set(int(k) for k in mp3_urls.keys()) - seen_parts
-        if parts:
-            chapter_to_part[ch] = min(parts)
-        seen_parts.update(parts)
-
-        # Partition the book by skimming through chapters and observing known parts.
-        print(f"Building structure chapter:part ({len(self.chapter_seconds)} chapters):", end='')
-        needs_end = True
-        for ch in range(len(self.chapter_seconds)):
-            print(f" {ch}", end='', flush=True)
-            parts = set(int(k) for k in self.requests_to_mp3_files()) - seen_parts
-            if chapter_to_part.get(ch) is None and parts:
+            print("Getting chapter:part structure.")
+
+            # Initialize part 1 always in chapter 0.
+            chapter_to_part = {0:1}
+            seen_parts = {1}
+
+            # Add the chapter the ereader started up in.
+            ch = self.chapter_containing(current_location)
+            parts = set(int(k) for k in mp3_urls.keys()) - seen_parts
+            if parts:
                 chapter_to_part[ch] = min(parts)
             seen_parts.update(parts)
-            if chapter_next.is_enabled():
-                chapter_next.click()
-                time.sleep(0.5)
-            else:
-                needs_end = False
-        print() # finish the above progress bar.
 
-        # Find the end of the book, including any trailing 'parts'.
-        trailing_parts = []
-        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-        if not needs_end:
-            p = max(seen_parts) if seen_parts else None
-            print(f"Found end of book at end of chapter {ch}, part {p}, at {to_hms(current_location)}")
-        else:
-            print(f"Did not find end of book, at {to_hms(current_location)}, digging deeper...")
-            skips = 0
-            old_location = current_location
-            while chapter_next.is_enabled():
-                chapter_next.click()
-                time.sleep(0.5)
-                skips += 1
+            # Partition the book by skimming through chapters and observing known parts.
+            print(f"Building structure chapter:part ({len(self.chapter_seconds)} chapters):", end='')
+            needs_end = True
+            for ch in range(len(self.chapter_seconds)):
+                print(f" {ch}", end='', flush=True)
+                parts = set(int(k) for k in self.requests_to_mp3_files()) - seen_parts
+                if chapter_to_part.get(ch) is None and parts:
+                    chapter_to_part[ch] = min(parts)
+                seen_parts.update(parts)
+                # The parts are indexed, their captured bodies are of no further use.
+                self.clear_request_store()
+                if chapter_next.is_enabled():
+                    mark = self.player_mark(timeline_current_time)
+                    chapter_next.click()
+                    self.wait_for_player(timeline_current_time, mark)
+                else:
+                    needs_end = False
+            print() # finish the above progress bar.
+            self.clear_request_store()
+
+            # Find the end of the book, including any trailing 'parts'.
+            trailing_parts = []
             current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-            parts = set(int(k) for k in self.requests_to_mp3_files()) - seen_parts
-            if skips or parts:
-                if parts:
-                    trailing_parts = parts
-                # This isn't terrible, we've found a lot of parts that will be fetched.
-                print(f"WARNING: {skips} chapters and parts {parts} NOT IN TABLE OF CONTENTS, from {to_hms(old_location)} to {to_hms(current_location)} (diff {to_hms(current_location - old_location)})")
-
-        # Invert the table of chapters to parts, to get a table where given the
-        # part we find which chapter to flip to: either the exact chapter, or
-        # the upper bound for its search (the uppoer bound is used because the
-        # lower bound will change as we find more parts).
-        part_to_chapter = {chapter_to_part[0]:0}
-        last_seen = chapter_to_part[0]
-        for ch, part in sorted(chapter_to_part.items()):
-            if ch == 0:
-                continue
-            # ch is the chapter exactly where 'part' is found.
-            for intermediate_pt in range(last_seen+1, part):
-                # often we don't see every part, so we fill in the gaps.
-                part_to_chapter[intermediate_pt] = ch - 1
-            last_seen = part
-            part_to_chapter[part] = ch
-        past_end = max(part_to_chapter.values()) + 1
-        for part in trailing_parts:
-            part_to_chapter[part] = past_end
+            if not needs_end:
+                p = max(seen_parts) if seen_parts else None
+                print(f"Found end of book at end of chapter {ch}, part {p}, at {to_hms(current_location)}")
+            else:
+                print(f"Did not find end of book, at {to_hms(current_location)}, digging deeper...")
+                skips = 0
+                old_location = current_location
+                while chapter_next.is_enabled():
+                    mark = self.player_mark(timeline_current_time)
+                    chapter_next.click()
+                    self.wait_for_player(timeline_current_time, mark)
+                    skips += 1
+                current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+                parts = set(int(k) for k in self.requests_to_mp3_files()) - seen_parts
+                if skips or parts:
+                    if parts:
+                        trailing_parts = parts
+                    # This isn't terrible, we've found a lot of parts that will be fetched.
+                    print(f"WARNING: {skips} chapters and parts {parts} NOT IN TABLE OF CONTENTS, from {to_hms(old_location)} to {to_hms(current_location)} (diff {to_hms(current_location - old_location)})")
+
+            # Invert the table of chapters to parts, to get a table where given the
+            # part we find which chapter to flip to: either the exact chapter, or
+            # the upper bound for its search (the uppoer bound is used because the
+            # lower bound will change as we find more parts).
+            part_to_chapter = {chapter_to_part[0]:0}
+            last_seen = chapter_to_part[0]
+            for ch, part in sorted(chapter_to_part.items()):
+                if ch == 0:
+                    continue
+                # ch is the chapter exactly where 'part' is found.
+                for intermediate_pt in range(last_seen+1, part):
+                    # often we don't see every part, so we fill in the gaps.
+                    part_to_chapter[intermediate_pt] = ch - 1
+                last_seen = part
+                part_to_chapter[part] = ch
+            past_end = max(part_to_chapter.values()) + 1
+            for part in trailing_parts:
+                part_to_chapter[part] = past_end
+
+            # Part boundaries are only learnt as parts download.
+            part_starts = {}
+            structure = {
+                "id": book_id,
+                "expected_time": expected_time,
+                "chapter_markers": chapter_markers,
+                "chapter_titles": chapter_titles,
+                "chapter_seconds": self.chapter_seconds,
+                "chapter_to_part": chapter_to_part,
+                "part_to_chapter": part_to_chapter,
+                "part_starts": part_starts,
+                "part_urls": self.requests_to_mp3_files(),
+            }
+            self.save_structure(download_path, structure)
 
         print("Got part->chapter structure:",
               [f"{part:02d}->{ch} ({to_hms(self.chapter_seconds[ch]) if ch < len(self.chapter_seconds) else '??:??'})"
@@ -405,211 +852,287 @@ class Scraper:
         # Download part files
         print("Getting files")
         current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-        loaded_duration = convert_metadata.get_total_duration(download_path)
+        # The manifest is the source of truth for what's already on disk.
+        manifest = PartManifest(download_path)
+        loaded_duration = manifest.total_duration()
+        loaded_exact = 0.0
+        part_lengths = {}
         part_num = 1
 
         # Check for resumable part files.
         print("Checking for resumable parts.")
         tmp_dir = download_path
         if loaded_duration:
-            parts = [f"part{part_num:02d}.mp3" for part_num in range(1, max(part_to_chapter)+1)]
-
-            # Check that the dir contains sequential part files.
-            resumable_parts = [part for part in parts if os.path.isfile(os.path.join(tmp_dir, part))]
-            if not resumable_parts or resumable_parts != parts[:len(resumable_parts)]:
-                print(f"ERROR: tmp folder contains corrupted download (check numbered parts), please remove or clean up: {tmp_dir}")
-                print(resumable_parts)
-                sys.exit(1)
-            resumable_parts = [fullname for part in parts if os.path.isfile(fullname := os.path.join(tmp_dir, part))]
-
-            # Sum the durations of the resumable parts.
-            exact_size = 0.0
-            for _, fullname in enumerate(resumable_parts, 1):
-                this_size = convert_metadata.get_mp3_duration(fullname)
-                exact_size += this_size
+            # Parts download out of order, so a stopped run can leave gaps.
+            # Every complete part is kept (the manifest checks them) and only
+            # the missing ones are fetched again.
+            resumable_parts = []
+            for resumed_num in range(1, max(part_to_chapter)+1):
+                part = f"part{resumed_num:02d}.mp3"
+                if os.path.isfile(fullname := os.path.join(tmp_dir, part)):
+                    part_lengths[resumed_num] = manifest.duration(part)
+                    resumable_parts.append(fullname)
+            exact_size = sum(part_lengths.values())
 
             # Check that the dir doesn't have any other media files (duration
             # range accounts for inexactness).
             if not loaded_duration - 10 < exact_size < loaded_duration + 10:
                 print(f"ERROR: tmp folder contains {to_hms(loaded_duration)} duration media files when expected {to_hms(int(exact_size))}, please remove or clean up: {tmp_dir}")
                 sys.exit(1)
-            part_num = len(resumable_parts) + 1
-            print(f"Resuming download from {part_num} part(s) at {to_hms(loaded_duration)}")
-
-        # Main loop for walking through book
-        while loaded_duration < expected_duration-1:
-            # Collect available urls, and download next part; this also detects
-            # loop end when audio is complete.
-            mp3_urls = self.requests_to_mp3_files()
-            url = mp3_urls.get(f"{part_num:02d}")
-            if url:
-                length = overdrive_download.download_mp3_part(url, part_num, download_path, self.get_cookies())
-                # If valid download, add the length of the part to the total, check progress through whole book
-                if length:
-                    # Use ground truth from metadata rather than adding approximations
-                    loaded_duration = convert_metadata.get_total_duration(download_path)
+            loaded_exact = exact_size
+            while part_num in part_lengths:
+                part_num += 1
+            if on_part:
+                for fullname in resumable_parts:
+                    on_part(fullname)
+            print(f"Resuming download at part {part_num}, {len(resumable_parts)} part(s) totalling {to_hms(loaded_duration)} already downloaded")
+
+        # Parts download in the background while the player keeps seeking.
+        downloader = overdrive_download.PartDownloader(download_path, self.config.get("download-workers", 2), manifest, self.config.get("download-segments", 1))
+        try:
+            probed_parts = set()
+
+            # Main loop for walking through book
+            while True:
+                # Account for finished downloads; this also detects loop end when
+                # audio is complete.
+                completed = downloader.completed()
+                for done_part, length in completed:
+                    if not length:
+                        print(f"Download failed for part {done_part}")
+                        sys.exit(3)
+                    # Durations come from each part's own metadata, not approximations.
+                    part_lengths[done_part] = length
+                    if on_part:
+                        on_part(os.path.join(download_path, f"part{done_part:02d}.mp3"))
+                    loaded_exact += length
+                    loaded_duration = int(loaded_exact)
                     print(f"{to_hms(loaded_duration)} / {to_hms(expected_duration)} - {loaded_duration}/{expected_duration} sec  -  {loaded_duration/expected_duration*100.0:.2f}%")
+                if completed:
+                    # Record the part boundaries we now know for the next retry.
+                    part_starts.update(part_starts_from_lengths(part_lengths))
+                    structure["part_urls"] = self.requests_to_mp3_files()
+                    self.save_structure(download_path, structure)
+                if loaded_duration >= expected_duration-1:
+                    break
+
+                if part_num in part_lengths:
+                    # Already downloaded before a gap an earlier run left.
                     part_num += 1
                     continue
-                else:
-                    print(f"Download failed for part {part_num}")
-                    sys.exit(3)
-
-            # Begin search for the absent part.
-            lower_bound = int(loaded_duration)
-            # Look up the upper bound in our table (we start at the end of the given chapter)
-            if part_num in part_to_chapter:
-                upper_bound = self.chapter_seconds[1 + part_to_chapter[part_num]]
-            else:
-                upper_bound = expected_duration
-            # Clip the upper bound to a maximum of 3 hours, should be longer
-            # than any reasonable part length. The algorithm will "collapse"
-            # upper and lower bounds if that isn't true, we'll detect that
-            # later.
-            if upper_bound - lower_bound > 3*60*60:
-                upper_bound = lower_bound + 3*60*60
-
-            print(f"Missing part {part_num} between ({lower_bound}, {upper_bound}) sec")
-            old_upper_bound = None
-            collapse_detected = False
-            while not self.has_url(part_num):
-                current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
 
-                # Require progress on each iteration.
-                if upper_bound == old_upper_bound:
-                    # One last effort.
-                    old_loc = current_location
-                    span = upper_bound - lower_bound
-                    print(f"Using play toggle between {to_hms(lower_bound)}, {to_hms(upper_bound)} ({span}s), start at {current_location}")
-                    first_try = True
-                    try:
-                        toggle_play.click()
-                        while first_try or (not self.has_url(part_num) and old_loc+span > current_location):
-                            time.sleep(5 if first_try else 1)
-                            current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-                            if not first_try and not current_location > old_loc:
-                                print(f"Play toggle might not be responding, location was {to_hms(old_loc)}, now {to_hms(current_location)}")
-                            first_try = False
-                    finally:
-                        if first_try:
-                            time.sleep(5)
-                        toggle_play.click()
-                    if self.has_url(part_num):
-                        print(f"Found part by using play toggle between {lower_bound}, {upper_bound}")
+                # Queue the next part as soon as its url is known, with the
+                # cookies as they are right now.
+                with self.mp3_urls_lock:
+                    url = self.mp3_urls.get(f"{part_num:02d}")
+                    captured = self.captured_parts.get(f"{part_num:02d}")
+                if url:
+                    # A capture still being written is quicker to wait for than to download.
+                    captured_path = captured.result() if captured else None
+                    downloader.submit(url, part_num, self.get_cookies(), captured_path)
+                    part_num += 1
+                    # The part is indexed, its captured audio is of no further use.
+                    self.clear_request_store()
+                    continue
+
+                # Parts follow a simple url pattern, so try a cheap probe before
+                # falling back to searching with the player.
+                if self.config.get("predict-parts") and part_num not in probed_parts:
+                    probed_parts.add(part_num)
+                    if self.probe_part_url(part_num):
                         continue
-                    print(f"Need more precise search for {upper_bound - lower_bound}s range between {to_hms(lower_bound)}, {upper_bound}")
-                    raise Exception(f"Need more precise search for {upper_bound - lower_bound}s range between {lower_bound}, {upper_bound}")
-                old_upper_bound = upper_bound
-
-                # Handle a "collapse" (lower==upper) by trying to search the whole book.
-                if not collapse_detected and lower_bound == upper_bound:
-                    print(f"Could not find part {part_num}, retrying by searching whole book.")
-                    upper_bound = self.chapter_seconds[-1]
-                    collapse_detected = True
-
-                # First, see if there's a chapter mark that is closer to our
-                # range than the current location.
-                chapter_move, current_chapter = self.closest_chapter_mark(lower_bound, upper_bound, current_location)
-                if chapter_move:
-                    desired_chapter, desired_chapter_start = chapter_move
-                    span = desired_chapter_start - current_location
-                    print(f"Skipping from chapter {current_chapter} to {desired_chapter}/{len(self.chapter_seconds)-1}, span {span}s.")
-
-                    chapter_table_open.click()
-                    time.sleep(1)
-
-                    chapter_title_elements = self.driver.find_elements(By.CLASS_NAME, 'chapter-dialog-row-title')
-
-                    for index, title in enumerate(chapter_title_elements):
-                        # Go to the beginning of the chapter we need, or the
-                        # last chapter if we're trying to get to the end.
-                        if index == desired_chapter or (index == len(chapter_title_elements) - 1 and upper_bound == expected_duration):
-                            title.click()
-                            break
-
-                    # Close chapter table
-                    chapter_table_close = self.driver.find_element(By.CLASS_NAME, 'shibui-shield')
-                    chapter_table_close.click()
-                    time.sleep(1)
 
+                # The search below needs the exact start of the missing part,
+                # which is the total duration of every part before it. Queued
+                # parts report theirs early, so the search goes on while they
+                # download.
+                queued_duration = downloader.wait_for_durations()
+                if queued_duration is None:
+                    # A part finished (or failed) meanwhile, collect it first.
+                    continue
+                if loaded_exact + queued_duration >= expected_duration-1:
+                    # Every part is queued, only their downloads are left.
+                    downloader.wait()
+                    continue
+
+                # Begin search for the absent part. Parts kept from an earlier
+                # run may lie after it, only the ones before it count.
+                lower_bound = int(sum(length for num, length in part_lengths.items() if num < part_num) + queued_duration)
+                # Look up the upper bound in our table (we start at the end of the given chapter)
+                if part_num in part_to_chapter:
+                    upper_bound = self.chapter_seconds[1 + part_to_chapter[part_num]]
+                else:
+                    upper_bound = expected_duration
+                # Clip the upper bound to a maximum of 3 hours, should be longer
+                # than any reasonable part length. The algorithm will "collapse"
+                # upper and lower bounds if that isn't true, we'll detect that
+                # later.
+                if upper_bound - lower_bound > 3*60*60:
+                    upper_bound = lower_bound + 3*60*60
+
+                print(f"Missing part {part_num} between ({lower_bound}, {upper_bound}) sec")
+                self.seek_count = 0
+                lower_bound, upper_bound = self.bisect_part(part_num, lower_bound, upper_bound, timeline_current_time, expected_duration)
+                old_upper_bound = None
+                collapse_detected = False
+                while not self.has_url(part_num):
                     current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-                    current_chapter = self.chapter_containing(current_location)
-                    current_chapter_start = self.chapter_seconds[current_chapter]
 
-                    # Sometimes the player dumps us in the middle of a chapter, so go back if optimal.
-                    if current_location > current_chapter_start:
-                        print(f"Player dumped us in the middle of a chapter, going back {current_location-current_chapter_start}s.")
-                        chapter_previous.click()
+                    # Require progress on each iteration.
+                    if upper_bound == old_upper_bound:
+                        # One last effort.
+                        old_loc = current_location
+                        span = upper_bound - lower_bound
+                        print(f"Using play toggle between {to_hms(lower_bound)}, {to_hms(upper_bound)} ({span}s), start at {current_location}")
+                        first_try = True
+                        try:
+                            mark = self.player_mark(timeline_current_time)
+                            toggle_play.click()
+                            while first_try or (not self.has_url(part_num) and old_loc+span > current_location):
+                                woke = self.wait_for_player(timeline_current_time, mark, 5 if first_try else 1)
+                                mark = self.player_mark(timeline_current_time)
+                                current_location = convert_metadata.to_seconds(mark[0])
+                                if not first_try and not woke and not current_location > old_loc:
+                                    print(f"Play toggle might not be responding, location was {to_hms(old_loc)}, now {to_hms(current_location)}")
+                                first_try = False
+                        finally:
+                            if first_try:
+                                time.sleep(5)
+                            toggle_play.click()
+                        if self.has_url(part_num):
+                            print(f"Found part by using play toggle between {lower_bound}, {upper_bound}")
+                            continue
+                        print(f"Need more precise search for {upper_bound - lower_bound}s range between {to_hms(lower_bound)}, {upper_bound}")
+                        raise Exception(f"Need more precise search for {upper_bound - lower_bound}s range between {lower_bound}, {upper_bound}")
+                    old_upper_bound = upper_bound
+
+                    # Handle a "collapse" (lower==upper) by trying to search the whole book.
+                    if not collapse_detected and lower_bound == upper_bound:
+                        print(f"Could not find part {part_num}, retrying by searching whole book.")
+                        upper_bound = self.chapter_seconds[-1]
+                        collapse_detected = True
+
+                    # First, see if there's a chapter mark that is closer to our
+                    # range than the current location.
+                    chapter_move, current_chapter = self.closest_chapter_mark(lower_bound, upper_bound, current_location)
+                    if chapter_move:
+                        desired_chapter, desired_chapter_start = chapter_move
+                        span = desired_chapter_start - current_location
+                        print(f"Skipping from chapter {current_chapter} to {desired_chapter}/{len(self.chapter_seconds)-1}, span {span}s.")
+
+                        chapter_table_open.click()
                         time.sleep(1)
+
+                        chapter_title_elements = self.driver.find_elements(By.CLASS_NAME, 'chapter-dialog-row-title')
+
+                        mark = self.player_mark(timeline_current_time)
+                        for index, title in enumerate(chapter_title_elements):
+                            # Go to the beginning of the chapter we need, or the
+                            # last chapter if we're trying to get to the end.
+                            if index == desired_chapter or (index == len(chapter_title_elements) - 1 and upper_bound == expected_duration):
+                                title.click()
+                                self.seek_count += 1
+                                break
+
+                        # Close chapter table
+                        chapter_table_close = self.driver.find_element(By.CLASS_NAME, 'shibui-shield')
+                        chapter_table_close.click()
+                        self.wait_for_player(timeline_current_time, mark, 1)
+
                         current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+                        current_chapter = self.chapter_containing(current_location)
+                        current_chapter_start = self.chapter_seconds[current_chapter]
+
+                        # Sometimes the player dumps us in the middle of a chapter, so go back if optimal.
+                        if current_location > current_chapter_start:
+                            print(f"Player dumped us in the middle of a chapter, going back {current_location-current_chapter_start}s.")
+                            mark = self.player_mark(timeline_current_time)
+                            chapter_previous.click()
+                            self.seek_count += 1
+                            self.wait_for_player(timeline_current_time, mark, 1)
+                            current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
 
+                        if self.has_url(part_num):
+                            continue
+                        elif lower_bound <= current_location < upper_bound:
+                            # Check for a possibly fuzzy lower_bound, mp3 sometimes is a few seconds off.
+                            if lower_bound <= current_location <= lower_bound + 15:
+                                lower_bound = current_location + 1
+                            else:
+                                # If there's an internal split, it gives us a new upper bound.
+                                print(f"No URL for {part_num} at {current_location}, reducing to {current_location-1}.")
+                                upper_bound = current_location - 1
+                    # Next, try to use the minute-skip key to get into the range.
+                    body = self.driver.find_element(By.TAG_NAME, "body")
+                    old_location = current_location
+                    while current_location <= lower_bound and current_location <= upper_bound-60 and not self.has_url(part_num):
+                        # ffwd into the range if you can, without going past it.
+                        mark = self.player_mark(timeline_current_time)
+                        body.send_keys(Keys.PAGE_DOWN)
+                        self.seek_count += 1
+                        self.wait_for_player(timeline_current_time, mark)
+                        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+                    while current_location-60 > lower_bound and not self.has_url(part_num):
+                        # frewind back to near the start of the range, without going past it.
+                        mark = self.player_mark(timeline_current_time)
+                        body.send_keys(Keys.PAGE_UP)
+                        self.seek_count += 1
+                        self.wait_for_player(timeline_current_time, mark)
+                        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
                     if self.has_url(part_num):
+                        # Shortcut if we're done.
                         continue
-                    elif lower_bound <= current_location < upper_bound:
-                        # Check for a possibly fuzzy lower_bound, mp3 sometimes is a few seconds off.
-                        if lower_bound <= current_location <= lower_bound + 15:
-                            lower_bound = current_location + 1
-                        else:
-                            # If there's an internal split, it gives us a new upper bound.
-                            print(f"No URL for {part_num} at {current_location}, reducing to {current_location-1}.")
-                            upper_bound = current_location - 1
-                # Next, try to use the minute-skip key to get into the range.
-                body = self.driver.find_element(By.TAG_NAME, "body")
-                old_location = current_location
-                while current_location <= lower_bound and current_location <= upper_bound-60 and not self.has_url(part_num):
-                    # ffwd into the range if you can, without going past it.
-                    body.send_keys(Keys.PAGE_DOWN)
-                    time.sleep(.5)
-                    current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-                while current_location-60 > lower_bound and not self.has_url(part_num):
-                    # frewind back to near the start of the range, without going past it.
-                    body.send_keys(Keys.PAGE_UP)
-                    time.sleep(.5)
-                    current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-                if self.has_url(part_num):
-                    # Shortcut if we're done.
-                    continue
-                if old_location != current_location:
-                    dir = "forward" if old_location < current_location else "backward"
-                    mins = abs(old_location - current_location) / 60
-                    print(f"Skipped {dir} {mins:.2f} mins")
-                if not self.has_url(part_num) and lower_bound < current_location <= upper_bound:
-                    print(f"No URL for {part_num} at {upper_bound}, reducing to {current_location-1}.")
-                    upper_bound = current_location - 1
-                # Next, try to use the small-skip key to get into the new range.
-                old_location = current_location
-                while current_location <= lower_bound and current_location <= upper_bound-15 and not self.has_url(part_num):
-                    # fwd into the range if you can, without going past it.
-                    body.send_keys(Keys.ARROW_RIGHT)
-                    time.sleep(.5)
-                    current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-                while current_location-15 > lower_bound and not self.has_url(part_num):
-                    # rewind back to near the start of the range, without going past it.
-                    body.send_keys(Keys.ARROW_LEFT)
-                    time.sleep(.5)
-                    current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
-                if self.has_url(part_num):
-                    continue
-                if old_location != current_location:
-                    dir = "forward" if old_location < current_location else "backward"
-                    mins = abs(old_location - current_location)
-                    print(f"Skipped {dir} {mins}s")
-                if not self.has_url(part_num) and lower_bound < current_location <= upper_bound:
-                    print(f"No URL for {part_num} at {upper_bound}, reducing to {current_location-1}.")
-                    upper_bound = current_location - 1
+                    if old_location != current_location:
+                        dir = "forward" if old_location < current_location else "backward"
+                        mins = abs(old_location - current_location) / 60
+                        print(f"Skipped {dir} {mins:.2f} mins")
+                    if not self.has_url(part_num) and lower_bound < current_location <= upper_bound:
+                        print(f"No URL for {part_num} at {upper_bound}, reducing to {current_location-1}.")
+                        upper_bound = current_location - 1
+                    # Next, try to use the small-skip key to get into the new range.
+                    old_location = current_location
+                    while current_location <= lower_bound and current_location <= upper_bound-15 and not self.has_url(part_num):
+                        # fwd into the range if you can, without going past it.
+                        mark = self.player_mark(timeline_current_time)
+                        body.send_keys(Keys.ARROW_RIGHT)
+                        self.seek_count += 1
+                        self.wait_for_player(timeline_current_time, mark)
+                        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+                    while current_location-15 > lower_bound and not self.has_url(part_num):
+                        # rewind back to near the start of the range, without going past it.
+                        mark = self.player_mark(timeline_current_time)
+                        body.send_keys(Keys.ARROW_LEFT)
+                        self.seek_count += 1
+                        self.wait_for_player(timeline_current_time, mark)
+                        current_location = convert_metadata.to_seconds(timeline_current_time.get_attribute("textContent"))
+                    if self.has_url(part_num):
+                        continue
+                    if old_location != current_location:
+                        dir = "forward" if old_location < current_location else "backward"
+                        mins = abs(old_location - current_location)
+                        print(f"Skipped {dir} {mins}s")
+                    if not self.has_url(part_num) and lower_bound < current_location <= upper_bound:
+                        print(f"No URL for {part_num} at {upper_bound}, reducing to {current_location-1}.")
+                        upper_bound = current_location - 1
+                print(f"Found part {part_num} after {self.seek_count} seek operation(s)")
+        finally:
+            # Running downloads finish before the tmp dir is left to a retry
+            # or the next stage, queued ones are dropped.
+            downloader.shutdown(cancel=True)
 
         if loaded_duration >= expected_duration-1:
             print("Downloaded complete audio")
             print(f"Book contained {part_num-1} part(s)")
-
-        # Attempt to find and save cover image
-        cover_image_url = next(
-            (req.url for req in self.driver.requests if req.response and '.jpg' in req.url and 'listen.overdrive.com' in req.url),
-            None
-        )
-
+        if self.capture_dir:
+            print(f"Reused captured audio for {downloader.reused} part(s)")
+        print(f"Player waits: {self.wait_stats['early']} ended early, {self.wait_stats['timeout']} timed out")
+        # ru_maxrss is in KiB on Linux; the proxy runs inside this process.
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Request store cleared {self.request_store_clears} time(s), peak memory {peak_mb:.0f} MB")
+
+        # Attempt to save the cover image seen by the interceptor
         cover_path = os.path.abspath(os.path.join(download_path, "cover.jpg"))
-        if overdrive_download.download_cover(cover_image_url, cover_path, self.get_cookies(), self.config.get("abort_on_warning", False)):
+        if overdrive_download.download_cover(self.cover_url, cover_path, self.get_cookies(), self.config.get("abort_on_warning", False)):
             print("Downloaded cover")
 
         return (chapter_markers, expected_time)
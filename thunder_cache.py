@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+import concurrent.futures
+import requests
+from atomicwrites import atomic_write
+import download_client
+
+THUNDER_URL = "https://thunder.api.overdrive.com/v2/media/{book_id}"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "odmpy-ng", "thunder")
+
+class ThunderCache:
+    """
+    On-disk cache of Thunder API metadata, one file per book.
+
+    Entries younger than the TTL are used as they are. Older ones are
+    revalidated with If-None-Match/If-Modified-Since, so an unchanged book
+    costs an empty 304 response, and are still used if the API can't be reached.
+    """
+    def __init__(self, cache_dir: str | None = None, ttl: int = 24*60*60, workers: int = 4):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached metadata.
+            ttl (int): Seconds an entry is used without asking the API.
+            workers (int): Books fetched at once by prefetch().
+        """
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.ttl = ttl
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pending = {} # book id -> Future from prefetch()
+        self.executor = None
+
+    def _path(self, book_id) -> str:
+        return os.path.join(self.cache_dir, f"{book_id}.json")
+
+    def _load(self, book_id) -> dict | None:
+        try:
+            with open(self._path(book_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable metadata cache entry for {book_id}: {e}")
+            return None
+
+    def _save(self, book_id, entry: dict):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with atomic_write(self._path(book_id), overwrite=True) as f:
+                json.dump(entry, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Warning: could not cache metadata for {book_id}: {e}")
+
+    def _fetch(self, book_id) -> dict | None:
+        entry = self._load(book_id)
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["data"]
+
+        conditional = {}
+        if entry and entry.get("etag"):
+            conditional["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = download_client.client.get(THUNDER_URL.format(book_id=book_id), extra_headers=conditional)
+        except requests.RequestException as e:
+            response = None
+            print(f"Failed to download metadata: {e}")
+
+        if response is not None and response.status_code == 304 and entry:
+            entry["fetched_at"] = time.time()
+        elif response is not None and response.status_code == 200:
+            entry = {
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "data": response.json(),
+            }
+        else:
+            if response is not None:
+                print(f"Failed to download metadata with status code {response.status_code}")
+            if entry:
+                print(f"Using cached metadata for {book_id}")
+            return entry["data"] if entry else None
+
+        self._save(book_id, entry)
+        return entry["data"]
+
+    def prefetch(self, book_ids: list):
+        """
+        Starts fetching metadata for several books in the background.
+
+        Args:
+            book_ids (list): IDs of the books to fetch.
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thunder")
+            for book_id in book_ids:
+                if book_id not in self.pending:
+                    self.pending[book_id] = self.executor.submit(self._fetch, book_id)
+
+    def get(self, book_id) -> dict | None:
+        """
+        Returns a book's metadata, waiting for its prefetch if one was started.
+
+        Args:
+            book_id: Unique book ID used by Thunder API.
+
+        Returns:
+            dict: The metadata, or None if it couldn't be fetched and isn't cached.
+        """
+        with self.lock:
+            future = self.pending.get(book_id)
+        if future:
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"Metadata prefetch for {book_id} failed: {e}")
+        return self._fetch(book_id)
+
+# The cache shared by every download in the process.
+cache = ThunderCache()
+
+def configure(config: dict, default_dir: str | None = None):
+    """
+    Replaces the shared cache with one using the location and TTL from the user configuration.
+
+    Args:
+        config (dict): Full user configuration.
+        default_dir (str): Cache directory used unless the configuration names one,
+            next to the config file so it lasts as long as the config does.
+    """
+    global cache
+    cache = ThunderCache(config.get("thunder_cache_dir") or default_dir, config.get("thunder_cache_ttl", 24*60*60))